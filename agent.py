@@ -3,33 +3,60 @@ Flight Search AI Agent - Simplified Version
 This agent uses Grok AI to search for flights and provide recommendations.
 """
 
-import os
-import json
 import time
+import atexit
+import queue
+import hashlib
+import orjson
 import schedule
 from datetime import datetime
-from pathlib import Path
 import logging
-from typing import Dict
-from dotenv import load_dotenv
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
 
+from config import CONFIG, SearchParams
 from grok_client import GrokClient
 from email_client import EmailClient
+from flight_searcher import FlightSearchCache, FlightSearcher
+from memory_manager import MemoryManager
 
-# Load environment variables
-load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
+def _configure_logging() -> QueueListener:
+    """
+    Configure logging so file and console writes happen on a background thread.
+    
+    Log calls only enqueue the record; a QueueListener drains the queue into
+    the real handlers.
+    """
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    handlers = [
         logging.FileHandler('/app/logs/agent.log'),
         logging.StreamHandler()
     ]
-)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(log_queue))
+    
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Flush queued records on interpreter exit
+    atexit.register(listener.stop)
+    return listener
+
+
+# Configure logging
+_log_listener = _configure_logging()
 logger = logging.getLogger(__name__)
 
+# How long a Grok analysis is reused for unchanged flight and price data; longer
+# than the daily schedule so an unchanged next-day run reliably hits
+ANALYSIS_CACHE_TTL = 36 * 60 * 60
+
 
 class FlightAgent:
     """AI Agent that uses Grok to search for flights and find the best deals."""
@@ -37,25 +64,148 @@ class FlightAgent:
     def __init__(self):
         """Initialize the flight agent."""
         self.grok_client = GrokClient(
-            api_key=os.getenv('GROK_API_KEY'),
-            api_base=os.getenv('GROK_API_BASE', 'https://api.x.ai/v1')
+            api_key=CONFIG.grok_api_key,
+            api_base=CONFIG.grok_api_base,
+            model=CONFIG.grok_model
         )
         self.email_client = EmailClient()
+        self.memory_manager = MemoryManager()
+        self.flight_searcher = FlightSearcher(
+            remote_url=CONFIG.selenium_remote_url,
+            reuse_session=CONFIG.selenium_reuse_session,
+            profile_dir=CONFIG.chrome_profile_dir,
+            cache=FlightSearchCache(store=self.memory_manager)
+        )
         
-        # Load search parameters from environment
-        self.search_params = {
-            'departure_airport': os.getenv('DEPARTURE_AIRPORT', 'IAD'),
-            'destination_airport': os.getenv('DESTINATION_AIRPORT', 'IDR'),
-            'departure_date_start': os.getenv('DEPARTURE_DATE_START', '2026-06-13'),
-            'departure_date_end': os.getenv('DEPARTURE_DATE_END', '2026-06-17'),
-            'return_date_start': os.getenv('RETURN_DATE_START', '2026-06-30'),
-            'return_date_end': os.getenv('RETURN_DATE_END', '2026-07-05'),
-            'passengers': int(os.getenv('PASSENGERS', '1')),
-            'travel_class': os.getenv('TRAVEL_CLASS', 'economy')
-        }
+        # Search parameters are read from the environment once, at import
+        self.search_params = CONFIG.search_params()
         
         logger.info("Flight Agent initialized with parameters: %s", self.search_params)
     
+    def search_flights(self, force_refresh: bool = False) -> List[Dict]:
+        """
+        Search Google Flights and Expedia concurrently.
+        
+        Args:
+            force_refresh: Search the sites even if recent results are cached
+            
+        Returns:
+            Combined list of flight dictionaries from all sources
+        """
+        searches = {
+            'Google Flights': self.flight_searcher.search_google_flights,
+            'Expedia': self.flight_searcher.search_expedia,
+        }
+        flights = []
+        
+        try:
+            with ThreadPoolExecutor(max_workers=len(searches)) as executor:
+                futures = {
+                    source: executor.submit(search, self.search_params, force_refresh)
+                    for source, search in searches.items()
+                }
+                # Collect each source separately so one failure doesn't drop the other
+                for source, future in futures.items():
+                    try:
+                        results = future.result()
+                        logger.info(f"Found {len(results)} flights on {source}")
+                        flights.extend(results)
+                    except Exception as e:
+                        logger.error(f"Error searching {source}: {e}", exc_info=True)
+        finally:
+            self.flight_searcher.close()
+        
+        return flights
+    
+    def analyze_flights(self, flights: List[Dict]) -> Dict:
+        """
+        Analyze flights for the configured route with Grok AI.
+        
+        Args:
+            flights: List of flight dictionaries
+            
+        Returns:
+            Analysis dictionary from Grok
+        """
+        return self.analyze_flights_batch([(self.search_params, flights)])[0]
+    
+    def analyze_flights_batch(self, route_data: List[Tuple[SearchParams, List[Dict]]]) -> List[Dict]:
+        """
+        Analyze flights for several routes with a single Grok request.
+        
+        A recent analysis of the same data is reused instead of calling Grok.
+        
+        Args:
+            route_data: List of (search_params, flights) tuples, one per route
+            
+        Returns:
+            List of analysis dictionaries, in the same order as route_data
+        """
+        historical_data = self.memory_manager.get_historical_prices()
+        key = self._analysis_cache_key(route_data, historical_data)
+        
+        cached = self.memory_manager.get_cached_analysis(key, ANALYSIS_CACHE_TTL)
+        if cached is not None:
+            logger.info("Flight data unchanged; reusing cached Grok analysis")
+            return cached
+        
+        prompt = self._create_analysis_prompt(route_data, historical_data)
+        analyses = self._split_analyses(self.grok_client.analyze(prompt), len(route_data))
+        self.memory_manager.save_cached_analysis(key, analyses, ANALYSIS_CACHE_TTL)
+        
+        return analyses
+    
+    def _analysis_cache_key(self, route_data: List[Tuple[SearchParams, List[Dict]]], historical_data: Dict) -> str:
+        """
+        Build a stable hash of the analysis inputs, ignoring timestamps.
+        
+        Only the overall price range is taken from the history: each save adds
+        a timestamped price row, which would otherwise change the key every run.
+        """
+        stable_routes = [
+            [params, [{k: v for k, v in flight.items() if k != 'timestamp'} for flight in flights]]
+            for params, flights in route_data
+        ]
+        price_range = [historical_data.get('min_price'), historical_data.get('max_price')]
+        payload = orjson.dumps([stable_routes, price_range], option=orjson.OPT_SORT_KEYS)
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+    
+    def _create_analysis_prompt(self, route_data: List[Tuple[SearchParams, List[Dict]]], historical_data: Dict) -> str:
+        """Create one Grok prompt covering the scraped flights of every route."""
+        sections = []
+        for i, (params, flights) in enumerate(route_data, 1):
+            flights_json = orjson.dumps(flights).decode()
+            sections.append(
+                f"Route {i}: {params.departure_airport} to {params.destination_airport}\n{flights_json}"
+            )
+        routes_text = '\n\n'.join(sections)
+        # Compact JSON keeps the prompt's token count down
+        history_json = orjson.dumps(historical_data).decode()
+        return f"""
+Analyze these flight search results for {len(route_data)} route(s):
+
+{routes_text}
+
+Historical price tracking data:
+{history_json}
+
+For each route, compare the options on price, duration and number of stops, and consider the price trend.
+Respond in JSON as {{"analyses": [...]}} with one object per route, in the order given above.
+Each object must have the keys "route", "recommendation" (the best option and why),
+"book_now" (true or false) and "reasoning".
+"""
+    
+    def _split_analyses(self, result: Dict, num_routes: int) -> List[Dict]:
+        """Split a batched Grok response into one analysis per route."""
+        analyses = result.get('analyses') if isinstance(result, dict) else None
+        if isinstance(analyses, list) and len(analyses) == num_routes:
+            return analyses
+        
+        # Unstructured response: share it across every route in the batch
+        if num_routes > 1:
+            logger.warning("Grok response did not contain per-route analyses; sharing it across routes")
+        return [result] * num_routes
+    
     def run_daily_search(self):
         """Main function to run the daily search routine."""
         logger.info("=" * 50)
@@ -63,9 +213,34 @@ class FlightAgent:
         logger.info("=" * 50)
         
         try:
-            # Ask Grok to search for flights
-            logger.info("Requesting Grok AI to search for flights...")
-            flight_recommendations = self.grok_client.search_flights(self.search_params)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                # Ask Grok for recommendations while the flight sites are scraped
+                logger.info("Requesting Grok AI to search for flights...")
+                recommendations_future = executor.submit(
+                    self.grok_client.search_flights, self.search_params
+                )
+                
+                # Search flight sites and store the results
+                logger.info("Searching Google Flights and Expedia...")
+                flights = self.search_flights()
+                if flights:
+                    timestamp = datetime.now().isoformat()
+                    self.memory_manager.save_flight_data(timestamp, flights)
+                    
+                    # Analyze the scraped flights with Grok; a failure here must
+                    # not stop the recommendations email below
+                    try:
+                        logger.info("Analyzing flights with Grok AI...")
+                        analysis = self.analyze_flights(flights)
+                        self.memory_manager.save_analysis(timestamp, analysis)
+                        logger.info(orjson.dumps(analysis, option=orjson.OPT_INDENT_2).decode())
+                        
+                        logger.info("Sending flight analysis email...")
+                        self.email_client.send_flight_analysis(flights, analysis, self.search_params)
+                    except Exception as e:
+                        logger.error(f"Error analyzing scraped flights: {e}", exc_info=True)
+                
+                flight_recommendations = recommendations_future.result()
             
             # Log the recommendations
             logger.info("=" * 50)
@@ -87,7 +262,7 @@ class FlightAgent:
     
     def start(self):
         """Start the agent with scheduled daily runs."""
-        run_time = os.getenv('RUN_TIME', '09:00')
+        run_time = CONFIG.run_time
         logger.info(f"Agent starting. Scheduled to run daily at {run_time}")
         
         # Schedule the daily job
@@ -97,11 +272,22 @@ class FlightAgent:
         logger.info("Running initial search...")
         self.run_daily_search()
         
-        # Keep running
+        # Keep running, sleeping until the next job is due instead of polling
         logger.info("Agent is now running. Waiting for next scheduled run...")
         while True:
+            idle_seconds = schedule.idle_seconds()
+            if idle_seconds is None:
+                break  # No jobs left to run
+            if idle_seconds > 0:
+                time.sleep(idle_seconds)
             schedule.run_pending()
-            time.sleep(60)  # Check every minute
+    
+    def close(self):
+        """Release browser, HTTP and SMTP connections and flush stored history."""
+        self.flight_searcher.close()
+        self.grok_client.close()
+        self.email_client.close()
+        self.memory_manager.close()
 
 
 def main():
@@ -109,10 +295,11 @@ def main():
     logger.info("Initializing Flight Search AI Agent...")
     
     # Verify required environment variables
-    if not os.getenv('GROK_API_KEY'):
+    if not CONFIG.grok_api_key:
         logger.error("GROK_API_KEY environment variable not set!")
         return
     
+    agent = None
     try:
         agent = FlightAgent()
         agent.start()
@@ -120,6 +307,9 @@ def main():
         logger.info("Agent stopped by user")
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
+    finally:
+        if agent is not None:
+            agent.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+"""
+Configuration for the Flight Search AI Agent, loaded once from the environment.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+@dataclass(frozen=True, slots=True)
+class SearchParams:
+    """Flight search parameters for a single route."""
+    
+    departure_airport: str
+    destination_airport: str
+    departure_date_start: str
+    departure_date_end: str
+    return_date_start: str
+    return_date_end: str
+    passengers: int
+    travel_class: str
+    
+    def to_dict(self) -> Dict:
+        """Get the parameters as a plain dictionary."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(frozen=True)
+class Config:
+    """Agent configuration read from environment variables."""
+    
+    # Grok API
+    grok_api_key: Optional[str] = field(repr=False)
+    grok_api_base: str
+    grok_model: str
+    
+    # Flight search parameters
+    departure_airport: str
+    destination_airport: str
+    departure_date_start: str
+    departure_date_end: str
+    return_date_start: str
+    return_date_end: str
+    passengers: int
+    travel_class: str
+    
+    # Schedule
+    run_time: str
+    
+    # Browser
+    selenium_remote_url: Optional[str]
+    selenium_reuse_session: bool
+    chrome_profile_dir: Optional[str]
+    
+    # Email notifications
+    smtp_host: str
+    smtp_port: int
+    smtp_user: Optional[str]
+    smtp_password: Optional[str] = field(repr=False)
+    email_to: Optional[str]
+    
+    @classmethod
+    def from_env(cls) -> 'Config':
+        """Build a configuration from the current environment."""
+        return cls(
+            grok_api_key=os.getenv('GROK_API_KEY'),
+            grok_api_base=os.getenv('GROK_API_BASE', 'https://api.x.ai/v1'),
+            grok_model=os.getenv('GROK_MODEL', 'grok-3'),
+            departure_airport=os.getenv('DEPARTURE_AIRPORT', 'IAD'),
+            destination_airport=os.getenv('DESTINATION_AIRPORT', 'IDR'),
+            departure_date_start=os.getenv('DEPARTURE_DATE_START', '2026-06-13'),
+            departure_date_end=os.getenv('DEPARTURE_DATE_END', '2026-06-17'),
+            return_date_start=os.getenv('RETURN_DATE_START', '2026-06-30'),
+            return_date_end=os.getenv('RETURN_DATE_END', '2026-07-05'),
+            passengers=int(os.getenv('PASSENGERS', '1')),
+            travel_class=os.getenv('TRAVEL_CLASS', 'economy'),
+            run_time=os.getenv('RUN_TIME', '09:00'),
+            selenium_remote_url=os.getenv('SELENIUM_REMOTE_URL') or None,
+            selenium_reuse_session=os.getenv('SELENIUM_REUSE_SESSION', 'false').lower() == 'true',
+            chrome_profile_dir=os.getenv('CHROME_PROFILE_DIR') or None,
+            smtp_host=os.getenv('SMTP_HOST', 'smtp.zoho.com'),
+            smtp_port=int(os.getenv('SMTP_PORT', '465')),
+            smtp_user=os.getenv('SMTP_USER'),
+            smtp_password=os.getenv('SMTP_PASSWORD'),
+            email_to=os.getenv('EMAIL_TO')
+        )
+    
+    def search_params(self) -> SearchParams:
+        """Get the flight search parameters."""
+        return SearchParams(
+            departure_airport=self.departure_airport,
+            destination_airport=self.destination_airport,
+            departure_date_start=self.departure_date_start,
+            departure_date_end=self.departure_date_end,
+            return_date_start=self.return_date_start,
+            return_date_end=self.return_date_end,
+            passengers=self.passengers,
+            travel_class=self.travel_class
+        )
+
+
+# Loaded once at import time
+CONFIG = Config.from_env()
@@ -2,27 +2,175 @@
 Email Client for sending flight analysis notifications.
 """
 
-import os
+import html
 import smtplib
 import logging
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Dict, List
+from string import Template
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+from config import CONFIG, Config, SearchParams
+
 logger = logging.getLogger(__name__)
 
+# Email templates are compiled once at import time and rendered per send
+_TEXT_TEMPLATE = Template("""
+Flight Search Results
+======================
+
+Search Parameters:
+- Route: ${departure_airport} → ${destination_airport}
+- Departure: ${departure_date_start} to ${departure_date_end}
+- Return: ${return_date_start} to ${return_date_end}
+- Passengers: ${passengers}
+- Class: ${travel_class}
+
+Found ${num_flights} flight options.
+
+AI Analysis:
+${analysis}
+
+Flight Details:
+${flights}
+
+---
+Generated on ${timestamp}
+""")
+
+_HTML_TEMPLATE = Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 800px; margin: 0 auto; padding: 20px; }
+        h1 { color: #2c3e50; border-bottom: 3px solid #3498db; padding-bottom: 10px; }
+        h2 { color: #34495e; margin-top: 30px; }
+        .params { background: #ecf0f1; padding: 15px; border-radius: 5px; margin: 20px 0; }
+        .param-item { margin: 5px 0; }
+        .analysis { background: #e8f5e9; padding: 15px; border-left: 4px solid #4caf50; margin: 20px 0; }
+        .flight { background: #fff; border: 1px solid #ddd; padding: 15px; margin: 10px 0; border-radius: 5px; }
+        .flight-header { font-weight: bold; color: #2980b9; margin-bottom: 10px; }
+        .price { color: #27ae60; font-size: 1.2em; font-weight: bold; }
+        .footer { margin-top: 30px; padding-top: 20px; border-top: 1px solid #ddd; color: #7f8c8d; font-size: 0.9em; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>✈️ Flight Search Results</h1>
+        
+        <div class="params">
+            <h2>Search Parameters</h2>
+            <div class="param-item"><strong>Route:</strong> ${departure_airport} → ${destination_airport}</div>
+            <div class="param-item"><strong>Departure:</strong> ${departure_date_start} to ${departure_date_end}</div>
+            <div class="param-item"><strong>Return:</strong> ${return_date_start} to ${return_date_end}</div>
+            <div class="param-item"><strong>Passengers:</strong> ${passengers}</div>
+            <div class="param-item"><strong>Class:</strong> ${travel_class}</div>
+        </div>
+        
+        <h2>📊 Found ${num_flights} Flight Options</h2>
+        
+        <div class="analysis">
+            <h2>🤖 AI Analysis</h2>
+            ${analysis}
+        </div>
+        
+        <h2>Flight Details</h2>
+        ${flights}
+        
+        <div class="footer">
+            Generated on ${timestamp}
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+_GROK_TEXT_TEMPLATE = Template("""
+Flight Search Results - Powered by Grok AI
+==========================================
+
+Search Parameters:
+- Route: ${departure_airport} → ${destination_airport}
+- Departure: ${departure_date_start} to ${departure_date_end}
+- Return: ${return_date_start} to ${return_date_end}
+- Passengers: ${passengers}
+- Class: ${travel_class}
+
+${recommendations}
+
+---
+Generated on ${timestamp}
+Powered by Grok AI
+""")
+
+_GROK_HTML_TEMPLATE = Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 800px; margin: 0 auto; padding: 20px; }
+        h1 { color: #2c3e50; border-bottom: 3px solid #3498db; padding-bottom: 10px; }
+        .params { background: #ecf0f1; padding: 15px; border-radius: 5px; margin: 20px 0; }
+        .param-item { margin: 5px 0; }
+        .recommendations { background: #fff; padding: 20px; border-left: 4px solid #3498db; margin: 20px 0; white-space: pre-wrap; }
+        .footer { margin-top: 30px; padding-top: 20px; border-top: 1px solid #ddd; color: #7f8c8d; font-size: 0.9em; }
+        .badge { background: #3498db; color: white; padding: 5px 10px; border-radius: 3px; font-size: 0.8em; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>✈️ Flight Recommendations <span class="badge">Powered by Grok AI</span></h1>
+        
+        <div class="params">
+            <h2>Search Parameters</h2>
+            <div class="param-item"><strong>Route:</strong> ${departure_airport} → ${destination_airport}</div>
+            <div class="param-item"><strong>Departure:</strong> ${departure_date_start} to ${departure_date_end}</div>
+            <div class="param-item"><strong>Return:</strong> ${return_date_start} to ${return_date_end}</div>
+            <div class="param-item"><strong>Passengers:</strong> ${passengers}</div>
+            <div class="param-item"><strong>Class:</strong> ${travel_class}</div>
+        </div>
+        
+        <div class="recommendations">
+            ${recommendations}
+        </div>
+        
+        <div class="footer">
+            Generated on ${timestamp}<br>
+            Powered by Grok AI
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+
+def _escape_params(search_params: SearchParams) -> Dict[str, str]:
+    """HTML-escape search parameters once for substitution into an HTML template."""
+    escaped = {key: html.escape(str(value)) for key, value in search_params.to_dict().items()}
+    escaped['travel_class'] = html.escape(search_params.travel_class.title())
+    return escaped
+
 
 class EmailClient:
     """Client for sending email notifications via SMTP."""
     
-    def __init__(self):
-        """Initialize email client with SMTP configuration."""
-        self.smtp_host = os.getenv('SMTP_HOST', 'smtp.zoho.com')
-        self.smtp_port = int(os.getenv('SMTP_PORT', '465'))
-        self.smtp_user = os.getenv('SMTP_USER')
-        self.smtp_password = os.getenv('SMTP_PASSWORD')
-        self.email_to = os.getenv('EMAIL_TO')
+    def __init__(self, config: Config = CONFIG):
+        """
+        Initialize email client with SMTP configuration.
+        
+        Args:
+            config: Agent configuration holding the SMTP settings
+        """
+        self.smtp_host = config.smtp_host
+        self.smtp_port = config.smtp_port
+        self.smtp_user = config.smtp_user
+        self.smtp_password = config.smtp_password
+        self.email_to = config.email_to
         
         if not all([self.smtp_user, self.smtp_password, self.email_to]):
             logger.warning("Email configuration incomplete. Email notifications will be disabled.")
@@ -30,44 +178,87 @@ class EmailClient:
         else:
             self.enabled = True
             logger.info(f"Email client initialized. Will send to: {self.email_to}")
+        
+        # Persistent SMTP session, reused across sends
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
     
-    def send_flight_analysis(self, flights: List[Dict], analysis: Dict, search_params: Dict) -> bool:
+    def _get_server(self) -> smtplib.SMTP_SSL:
         """
-        Send flight analysis results via email.
+        Get a logged-in SMTP connection, reconnecting if the cached one is dead.
+        
+        Must be called with self._smtp_lock held.
+        """
+        if self._smtp is not None:
+            try:
+                status, _ = self._smtp.noop()
+                if status == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard_server()
+        
+        server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port)
+        try:
+            server.login(self.smtp_user, self.smtp_password)
+        except Exception:
+            server.close()
+            raise
+        self._smtp = server
+        logger.info(f"Connected to SMTP server {self.smtp_host}:{self.smtp_port}")
+        return server
+    
+    def _discard_server(self) -> None:
+        """Drop the cached SMTP connection without sending QUIT."""
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            except Exception:
+                pass
+            self._smtp = None
+    
+    def close(self) -> None:
+        """Close the persistent SMTP connection."""
+        with self._smtp_lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except Exception as e:
+                    logger.debug(f"Error closing SMTP connection: {e}")
+                self._smtp = None
+                logger.info("SMTP connection closed")
+    
+    def _send(self, subject: str, text_body: str, html_body: str) -> bool:
+        """
+        Send a multipart email with plain text and HTML alternatives.
         
         Args:
-            flights: List of flight data
-            analysis: Analysis results from Grok AI
-            search_params: Search parameters used
+            subject: Email subject line
+            text_body: Plain text version of the body
+            html_body: HTML version of the body
             
         Returns:
             True if email sent successfully, False otherwise
         """
-        if not self.enabled:
-            logger.warning("Email client not enabled. Skipping email notification.")
-            return False
-        
         try:
             # Create email message
             msg = MIMEMultipart('alternative')
-            msg['Subject'] = f"Flight Search Results: {search_params['departure_airport']} → {search_params['destination_airport']}"
+            msg['Subject'] = subject
             msg['From'] = self.smtp_user
             msg['To'] = self.email_to
             
-            # Create email body
-            html_body = self._create_html_body(flights, analysis, search_params)
-            text_body = self._create_text_body(flights, analysis, search_params)
-            
             # Attach both plain text and HTML versions
-            part1 = MIMEText(text_body, 'plain')
-            part2 = MIMEText(html_body, 'html')
-            msg.attach(part1)
-            msg.attach(part2)
+            msg.attach(MIMEText(text_body, 'plain'))
+            msg.attach(MIMEText(html_body, 'html'))
             
-            # Send email via SMTP
-            with smtplib.SMTP_SSL(self.smtp_host, self.smtp_port) as server:
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            # Send email over the persistent SMTP session
+            with self._smtp_lock:
+                try:
+                    self._get_server().send_message(msg)
+                except smtplib.SMTPServerDisconnected:
+                    # Server hung up between the NOOP and the send; retry once
+                    self._discard_server()
+                    self._get_server().send_message(msg)
             
             logger.info(f"Email sent successfully to {self.email_to}")
             return True
@@ -76,83 +267,67 @@ class EmailClient:
             logger.error(f"Failed to send email: {e}", exc_info=True)
             return False
     
-    def _create_text_body(self, flights: List[Dict], analysis: Dict, search_params: Dict) -> str:
-        """Create plain text email body."""
-        body = f"""
-Flight Search Results
-======================
-
-Search Parameters:
-- Route: {search_params['departure_airport']} → {search_params['destination_airport']}
-- Departure: {search_params['departure_date_start']} to {search_params['departure_date_end']}
-- Return: {search_params['return_date_start']} to {search_params['return_date_end']}
-- Passengers: {search_params['passengers']}
-- Class: {search_params['travel_class']}
-
-Found {len(flights)} flight options.
-
-AI Analysis:
-{self._format_analysis_text(analysis)}
-
-Flight Details:
-{self._format_flights_text(flights)}
-
----
-Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-"""
-        return body
+    def send_flight_analysis(self, flights: List[Dict], analysis: Dict, search_params: SearchParams) -> bool:
+        """
+        Send flight analysis results via email.
+        
+        Args:
+            flights: List of flight data
+            analysis: Analysis results from Grok AI
+            search_params: Search parameters used
+            
+        Returns:
+            True if email sent successfully, False otherwise
+        """
+        if not self.enabled:
+            logger.warning("Email client not enabled. Skipping email notification.")
+            return False
+        
+        subject = f"Flight Search Results: {search_params.departure_airport} → {search_params.destination_airport}"
+        text_body, html_body = self._render_flight_analysis(flights, analysis, search_params)
+        return self._send(subject, text_body, html_body)
     
-    def _create_html_body(self, flights: List[Dict], analysis: Dict, search_params: Dict) -> str:
-        """Create HTML email body."""
-        html = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-        .container {{ max-width: 800px; margin: 0 auto; padding: 20px; }}
-        h1 {{ color: #2c3e50; border-bottom: 3px solid #3498db; padding-bottom: 10px; }}
-        h2 {{ color: #34495e; margin-top: 30px; }}
-        .params {{ background: #ecf0f1; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-        .param-item {{ margin: 5px 0; }}
-        .analysis {{ background: #e8f5e9; padding: 15px; border-left: 4px solid #4caf50; margin: 20px 0; }}
-        .flight {{ background: #fff; border: 1px solid #ddd; padding: 15px; margin: 10px 0; border-radius: 5px; }}
-        .flight-header {{ font-weight: bold; color: #2980b9; margin-bottom: 10px; }}
-        .price {{ color: #27ae60; font-size: 1.2em; font-weight: bold; }}
-        .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #ddd; color: #7f8c8d; font-size: 0.9em; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>✈️ Flight Search Results</h1>
+    def _render_flight_analysis(self, flights: List[Dict], analysis: Dict, search_params: SearchParams) -> Tuple[str, str]:
+        """Render the plain text and HTML bodies for a flight analysis email."""
+        text_fields, html_fields = self._build_fields(search_params, flights=flights, analysis=analysis)
+        return _TEXT_TEMPLATE.substitute(text_fields), _HTML_TEMPLATE.substitute(html_fields)
+    
+    def _build_fields(self, search_params: SearchParams, flights: Optional[List[Dict]] = None,
+                      analysis: Optional[Dict] = None, recommendations: Optional[str] = None) -> Tuple[Dict, Dict]:
+        """
+        Build the template fields for both the plain text and HTML bodies.
         
-        <div class="params">
-            <h2>Search Parameters</h2>
-            <div class="param-item"><strong>Route:</strong> {search_params['departure_airport']} → {search_params['destination_airport']}</div>
-            <div class="param-item"><strong>Departure:</strong> {search_params['departure_date_start']} to {search_params['departure_date_end']}</div>
-            <div class="param-item"><strong>Return:</strong> {search_params['return_date_start']} to {search_params['return_date_end']}</div>
-            <div class="param-item"><strong>Passengers:</strong> {search_params['passengers']}</div>
-            <div class="param-item"><strong>Class:</strong> {search_params['travel_class'].title()}</div>
-        </div>
+        Values shared by both formats (timestamp, flight count) are computed
+        once; only the sections that differ between formats are formatted twice.
         
-        <h2>📊 Found {len(flights)} Flight Options</h2>
+        Args:
+            search_params: Search parameters used
+            flights: List of flight data, for analysis emails
+            analysis: Analysis results from Grok AI, for analysis emails
+            recommendations: Grok's recommendations text, for recommendation emails
+            
+        Returns:
+            Tuple of (text_fields, html_fields)
+        """
+        shared = {'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        if flights is not None:
+            shared['num_flights'] = len(flights)
         
-        <div class="analysis">
-            <h2>🤖 AI Analysis</h2>
-            {self._format_analysis_html(analysis)}
-        </div>
+        text_fields = {**search_params.to_dict(), **shared}
+        html_fields = {**_escape_params(search_params), **shared}
         
-        <h2>Flight Details</h2>
-        {self._format_flights_html(flights)}
+        if flights is not None:
+            text_fields['flights'] = self._format_flights_text(flights)
+            html_fields['flights'] = self._format_flights_html(flights)
+            text_fields['analysis'] = self._format_analysis_text(analysis)
+            html_fields['analysis'] = self._format_analysis_html(analysis)
         
-        <div class="footer">
-            Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-        </div>
-    </div>
-</body>
-</html>
-"""
-        return html
+        if recommendations is not None:
+            text_fields['recommendations'] = recommendations
+            # Escape, then convert newlines to <br> and preserve formatting
+            html_fields['recommendations'] = html.escape(recommendations).replace('\n', '<br>')
+        
+        return text_fields, html_fields
     
     def _format_analysis_text(self, analysis: Dict) -> str:
         """Format analysis for plain text."""
@@ -172,17 +347,17 @@ Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         
         if isinstance(analysis, dict):
             if 'recommendation' in analysis:
-                # Convert newlines to <br> for HTML
-                recommendation = analysis['recommendation'].replace('\n', '<br>')
+                # Escape, then convert newlines to <br> for HTML
+                recommendation = html.escape(str(analysis['recommendation'])).replace('\n', '<br>')
                 return f"<p>{recommendation}</p>"
             
             # Format dict as HTML list
             items = []
             for key, value in analysis.items():
-                items.append(f"<li><strong>{key}:</strong> {value}</li>")
+                items.append(f"<li><strong>{html.escape(str(key))}:</strong> {html.escape(str(value))}</li>")
             return f"<ul>{''.join(items)}</ul>"
         
-        return f"<p>{str(analysis)}</p>"
+        return f"<p>{html.escape(str(analysis))}</p>"
     
     def _format_flights_text(self, flights: List[Dict]) -> str:
         """Format flights for plain text."""
@@ -191,20 +366,22 @@ Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         
         result = []
         for i, flight in enumerate(flights[:10], 1):  # Limit to 10 flights
-            result.append(f"\n{i}. {flight.get('source', 'Unknown')}")
-            result.append(f"   Date: {flight.get('date', 'N/A')}")
-            result.append(f"   Price: {flight.get('price', 'N/A')}")
-            if 'departure_time' in flight:
-                result.append(f"   Departure: {flight.get('departure_time', 'N/A')}")
-            if 'arrival_time' in flight:
-                result.append(f"   Arrival: {flight.get('arrival_time', 'N/A')}")
+            get = flight.get
+            departure = f"\n   Departure: {get('departure_time')}" if 'departure_time' in flight else ''
+            arrival = f"\n   Arrival: {get('arrival_time')}" if 'arrival_time' in flight else ''
+            result.append(
+                f"\n{i}. {get('source', 'Unknown')}"
+                f"\n   Date: {get('date', 'N/A')}"
+                f"\n   Price: {get('price', 'N/A')}"
+                f"{departure}{arrival}"
+            )
         
         if len(flights) > 10:
             result.append(f"\n... and {len(flights) - 10} more flights")
         
         return '\n'.join(result)
     
-    def send_grok_recommendations(self, recommendations: str, search_params: Dict) -> bool:
+    def send_grok_recommendations(self, recommendations: str, search_params: SearchParams) -> bool:
         """
         Send Grok AI flight recommendations via email.
         
@@ -219,102 +396,14 @@ Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             logger.warning("Email client not enabled. Skipping email notification.")
             return False
         
-        try:
-            # Create email message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f"Flight Recommendations: {search_params['departure_airport']} → {search_params['destination_airport']}"
-            msg['From'] = self.smtp_user
-            msg['To'] = self.email_to
-            
-            # Create email body
-            html_body = self._create_grok_html_body(recommendations, search_params)
-            text_body = self._create_grok_text_body(recommendations, search_params)
-            
-            # Attach both plain text and HTML versions
-            part1 = MIMEText(text_body, 'plain')
-            part2 = MIMEText(html_body, 'html')
-            msg.attach(part1)
-            msg.attach(part2)
-            
-            # Send email via SMTP
-            with smtplib.SMTP_SSL(self.smtp_host, self.smtp_port) as server:
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
-            
-            logger.info(f"Email sent successfully to {self.email_to}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to send email: {e}", exc_info=True)
-            return False
-    
-    def _create_grok_text_body(self, recommendations: str, search_params: Dict) -> str:
-        """Create plain text email body for Grok recommendations."""
-        body = f"""
-Flight Search Results - Powered by Grok AI
-==========================================
-
-Search Parameters:
-- Route: {search_params['departure_airport']} → {search_params['destination_airport']}
-- Departure: {search_params['departure_date_start']} to {search_params['departure_date_end']}
-- Return: {search_params['return_date_start']} to {search_params['return_date_end']}
-- Passengers: {search_params['passengers']}
-- Class: {search_params['travel_class']}
-
-{recommendations}
-
----
-Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-Powered by Grok AI
-"""
-        return body
+        subject = f"Flight Recommendations: {search_params.departure_airport} → {search_params.destination_airport}"
+        text_body, html_body = self._render_grok_recommendations(recommendations, search_params)
+        return self._send(subject, text_body, html_body)
     
-    def _create_grok_html_body(self, recommendations: str, search_params: Dict) -> str:
-        """Create HTML email body for Grok recommendations."""
-        # Convert newlines to <br> and preserve formatting
-        formatted_recommendations = recommendations.replace('\n', '<br>')
-        
-        html = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-        .container {{ max-width: 800px; margin: 0 auto; padding: 20px; }}
-        h1 {{ color: #2c3e50; border-bottom: 3px solid #3498db; padding-bottom: 10px; }}
-        .params {{ background: #ecf0f1; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-        .param-item {{ margin: 5px 0; }}
-        .recommendations {{ background: #fff; padding: 20px; border-left: 4px solid #3498db; margin: 20px 0; white-space: pre-wrap; }}
-        .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #ddd; color: #7f8c8d; font-size: 0.9em; }}
-        .badge {{ background: #3498db; color: white; padding: 5px 10px; border-radius: 3px; font-size: 0.8em; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>✈️ Flight Recommendations <span class="badge">Powered by Grok AI</span></h1>
-        
-        <div class="params">
-            <h2>Search Parameters</h2>
-            <div class="param-item"><strong>Route:</strong> {search_params['departure_airport']} → {search_params['destination_airport']}</div>
-            <div class="param-item"><strong>Departure:</strong> {search_params['departure_date_start']} to {search_params['departure_date_end']}</div>
-            <div class="param-item"><strong>Return:</strong> {search_params['return_date_start']} to {search_params['return_date_end']}</div>
-            <div class="param-item"><strong>Passengers:</strong> {search_params['passengers']}</div>
-            <div class="param-item"><strong>Class:</strong> {search_params['travel_class'].title()}</div>
-        </div>
-        
-        <div class="recommendations">
-            {formatted_recommendations}
-        </div>
-        
-        <div class="footer">
-            Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}<br>
-            Powered by Grok AI
-        </div>
-    </div>
-</body>
-</html>
-"""
-        return html
+    def _render_grok_recommendations(self, recommendations: str, search_params: SearchParams) -> Tuple[str, str]:
+        """Render the plain text and HTML bodies for a Grok recommendations email."""
+        text_fields, html_fields = self._build_fields(search_params, recommendations=recommendations)
+        return _GROK_TEXT_TEMPLATE.substitute(text_fields), _GROK_HTML_TEMPLATE.substitute(html_fields)
     
     def _format_flights_html(self, flights: List[Dict]) -> str:
         """Format flights for HTML."""
@@ -323,13 +412,16 @@ Powered by Grok AI
         
         result = []
         for i, flight in enumerate(flights[:10], 1):  # Limit to 10 flights
+            get = flight.get
+            departure = f"<div><strong>Departure:</strong> {html.escape(str(get('departure_time')))}</div>" if 'departure_time' in flight else ''
+            arrival = f"<div><strong>Arrival:</strong> {html.escape(str(get('arrival_time')))}</div>" if 'arrival_time' in flight else ''
             result.append(f"""
             <div class="flight">
-                <div class="flight-header">Flight {i} - {flight.get('source', 'Unknown')}</div>
-                <div><strong>Date:</strong> {flight.get('date', 'N/A')}</div>
-                <div class="price">Price: {flight.get('price', 'N/A')}</div>
-                {'<div><strong>Departure:</strong> ' + flight.get('departure_time', 'N/A') + '</div>' if 'departure_time' in flight else ''}
-                {'<div><strong>Arrival:</strong> ' + flight.get('arrival_time', 'N/A') + '</div>' if 'arrival_time' in flight else ''}
+                <div class="flight-header">Flight {i} - {html.escape(str(get('source', 'Unknown')))}</div>
+                <div><strong>Date:</strong> {html.escape(str(get('date', 'N/A')))}</div>
+                <div class="price">Price: {html.escape(str(get('price', 'N/A')))}</div>
+                {departure}
+                {arrival}
             </div>
             """)
         
@@ -3,171 +3,584 @@ Flight Searcher for querying flight information from various platforms.
 """
 
 import logging
+import os
+import queue
+import socket
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.webdriver.remote.command import Command
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from config import SearchParams
 
 logger = logging.getLogger(__name__)
 
+# Minimum delay between starting page loads on the same site
+RATE_LIMIT_SECONDS = 2.0
+
+# Maximum page loads in flight on the same site
+CONCURRENCY_PER_DOMAIN = 4
+
+# Maximum time to wait for search results to appear after loading a page
+PAGE_LOAD_TIMEOUT = 10
+
+# Returns the first arguments[1] results' text, truncated, in one round-trip
+RESULT_TEXTS_SCRIPT = (
+    "return Array.from(document.querySelectorAll(arguments[0]))"
+    ".slice(0, arguments[1]).map(e => (e.innerText || '').slice(0, 200));"
+)
+
+# Fields the simplified extractors can't read from the page yet
+FLIGHT_RECORD_TEMPLATE = {
+    'price': None,  # Would extract from text
+    'airline': 'Various',  # Would extract from elements
+    'duration': 'Unknown',  # Would extract from elements
+    'stops': 'Unknown',  # Would extract from elements
+}
+
+# Chrome content settings (2 = block) for resources the scraper never reads
+CHROME_CONTENT_PREFS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.managed_default_content_settings.stylesheets": 2,
+    "profile.managed_default_content_settings.fonts": 2,
+    "profile.managed_default_content_settings.plugins": 2,
+    "profile.managed_default_content_settings.popups": 2,
+    "profile.default_content_setting_values.cookies": 1,
+}
+
+# Upper bound on each persistent profile's HTTP cache
+CHROME_DISK_CACHE_BYTES = 50 * 1024 * 1024
+
+# Lock files a Chrome holds in its profile, left behind if it exits uncleanly
+CHROME_SINGLETON_FILES = ('SingletonLock', 'SingletonSocket', 'SingletonCookie')
+
+# How long scraped results for the same query are reused
+SEARCH_CACHE_TTL = 12 * 60 * 60
+
+# Elements that mark a loaded results page
+GOOGLE_FLIGHTS_RESULTS = "[role='listitem']"
+EXPEDIA_RESULTS = "[data-test-id*='offer']"
+
+
+class RateLimiter:
+    """Spaces out requests to each host and caps how many run at once per host."""
+    
+    def __init__(self, min_interval: float, max_concurrent: int = 4):
+        """
+        Initialize the rate limiter.
+        
+        Args:
+            min_interval: Minimum seconds between request starts to the same host
+            max_concurrent: Maximum requests in flight to the same host
+        """
+        self.min_interval = min_interval
+        self.max_concurrent = max_concurrent
+        self._next_slot = {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def request(self, host: str) -> Iterator[None]:
+        """Hold one of host's concurrency slots, starting no sooner than its rate allows."""
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.max_concurrent)
+        
+        # Take a concurrency slot first so the reserved start time isn't spent waiting
+        with semaphore:
+            self.wait(host)
+            yield
+    
+    def wait(self, host: str) -> None:
+        """Block until the caller may send its next request to host."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        
+        # No wait if the last request to this host started long enough ago
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class FlightSearchCache:
+    """
+    LRU cache of per-date search results that expire after a TTL.
+    
+    Keys are (source, origin, destination, departure_date, return_date, passengers)
+    tuples. On a miss, an optional store (MemoryManager) is checked for
+    results saved by an earlier run.
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = SEARCH_CACHE_TTL, store=None):
+        """
+        Initialize the cache.
+        
+        Args:
+            maxsize: Maximum number of queries kept in memory
+            ttl: Seconds before cached results expire
+            store: Optional MemoryManager providing get_cached_flights()
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        """Get unexpired results for a query, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                cached_at, flights = entry
+                if time.monotonic() - cached_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    return flights
+                del self._entries[key]
+        
+        if self.store is not None:
+            return self.store.get_cached_flights(*key, max_age=self.ttl)
+        return None
+    
+    def put(self, key: Tuple, flights: List[Dict]) -> None:
+        """Cache results for a query, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), flights)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class WebDriverPool:
+    """Thread-safe pool of WebDrivers, created lazily up to pool_size."""
+    
+    def __init__(self, factory: Callable[[], webdriver.Chrome], pool_size: int = 8):
+        """
+        Initialize the pool.
+        
+        Args:
+            factory: Callable that creates a new configured WebDriver
+            pool_size: Maximum number of WebDrivers to run at once
+        """
+        self.pool_size = pool_size
+        self._factory = factory
+        self._idle = queue.Queue()
+        self._drivers = []
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> webdriver.Chrome:
+        """Take an idle WebDriver, starting a new one if the pool isn't full."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.pool_size
+            if can_create:
+                self._created += 1
+        
+        if not can_create:
+            return self._idle.get()
+        
+        # Start the browser outside the lock so several can launch in parallel
+        try:
+            driver = self._factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._drivers.append(driver)
+        return driver
+    
+    def release(self, driver: webdriver.Chrome) -> None:
+        """Return a WebDriver to the pool."""
+        self._idle.put(driver)
+    
+    @contextmanager
+    def driver(self) -> Iterator[webdriver.Chrome]:
+        """Borrow a WebDriver for the duration of a with block."""
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+    
+    def close(self, dispose: Optional[Callable[[webdriver.Chrome], None]] = None) -> None:
+        """
+        Empty the pool, quitting every WebDriver it created.
+        
+        Args:
+            dispose: Called for each WebDriver instead of quit()
+        """
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+            self._created = 0
+            self._idle = queue.Queue()
+        for driver in drivers:
+            try:
+                if dispose is None:
+                    driver.quit()
+                else:
+                    dispose(driver)
+            except Exception as e:
+                logger.debug(f"Error closing WebDriver: {e}")
+        if drivers:
+            logger.info(f"Closed {len(drivers)} WebDriver(s)")
+
+
+class AttachedRemote(webdriver.Remote):
+    """Remote WebDriver that attaches to an existing browser session instead of starting one."""
+    
+    def __init__(self, session_id: str, **kwargs):
+        """
+        Attach to a running session.
+        
+        Args:
+            session_id: ID of the session to attach to
+            **kwargs: Arguments for webdriver.Remote
+        """
+        self._attach_session_id = session_id
+        super().__init__(**kwargs)
+    
+    def start_session(self, capabilities: dict) -> None:
+        """Reuse the existing session, failing if it is no longer alive."""
+        self.session_id = self._attach_session_id
+        self.caps = capabilities
+        self.execute(Command.GET_CURRENT_URL)
+
 
 class FlightSearcher:
     """Searches for flights on various platforms."""
     
-    def __init__(self):
-        """Initialize the flight searcher."""
-        self.driver = None
+    def __init__(self, pool_size: int = 8, remote_url: Optional[str] = None,
+                 reuse_session: bool = False, session_file: str = "/app/data/.selenium_sessions.dat",
+                 cache: Optional[FlightSearchCache] = None,
+                 concurrency_per_domain: int = CONCURRENCY_PER_DOMAIN,
+                 profile_dir: Optional[str] = None):
+        """
+        Initialize the flight searcher.
+        
+        Args:
+            pool_size: Maximum number of Chrome instances used to search dates in parallel
+            remote_url: URL of a running Selenium server; a local Chrome is started if None
+            reuse_session: Keep remote browser sessions alive between runs and reattach to them
+            session_file: File where reusable remote session IDs are stored
+            cache: Cache of recent search results; an in-memory cache is used if None
+            concurrency_per_domain: Maximum page loads in flight on the same site
+            profile_dir: Directory of persistent profiles for local Chrome; a fresh
+                profile is used per launch if None
+        """
+        self.remote_url = remote_url
+        self.reuse_session = reuse_session and remote_url is not None
+        self.session_file = Path(session_file)
+        self._session_ids = self._load_session_ids() if self.reuse_session else []
+        self._session_lock = threading.Lock()
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self._profiles_in_use = 0
+        
+        self.pool = WebDriverPool(self._create_driver, pool_size)
+        self.rate_limiter = RateLimiter(RATE_LIMIT_SECONDS, concurrency_per_domain)
+        self.cache = cache if cache is not None else FlightSearchCache()
         logger.info("Flight searcher initialized")
     
-    def _get_driver(self) -> webdriver.Chrome:
-        """Get a configured Chrome WebDriver."""
-        if self.driver is None:
-            chrome_options = Options()
-            chrome_options.add_argument('--headless')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1920,1080')
-            chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    @staticmethod
+    def _claim_profile(profile: Path) -> bool:
+        """
+        Check that no live Chrome holds a profile, clearing locks left by a dead one.
+        
+        SingletonLock links to "<hostname>-<pid>" of the Chrome holding the
+        profile. A lock from another host (e.g. before the container was
+        recreated) or from a PID that has exited would make Chrome refuse the
+        profile, so it is removed. A lock held by a running Chrome on this host,
+        such as one that failed to quit or belongs to another agent process,
+        is left alone.
+        
+        Args:
+            profile: Profile directory about to be passed to Chrome
             
-            self.driver = webdriver.Chrome(options=chrome_options)
+        Returns:
+            True if the profile is free to use, False if a live Chrome holds it
+        """
+        try:
+            owner = os.readlink(profile / 'SingletonLock')
+        except OSError:
+            # No lock, so nothing is running on this profile
+            return True
+        
+        host, _, pid = owner.rpartition('-')
+        if host == socket.gethostname() and pid.isdigit():
+            try:
+                os.kill(int(pid), 0)
+                return False
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                # The process exists but belongs to another user
+                return False
+        
+        for name in CHROME_SINGLETON_FILES:
+            try:
+                (profile / name).unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"Could not remove stale Chrome lock {profile / name}: {e}")
+        return True
+    
+    def _create_driver(self) -> webdriver.Chrome:
+        """Create a configured Chrome WebDriver, reattaching to a saved session if possible."""
+        chrome_options = Options()
+        chrome_options.add_argument('--headless')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--window-size=1920,1080')
+        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+        
+        # Only the DOM text is scraped, so skip downloading images, styles and fonts
+        chrome_options.add_experimental_option('prefs', CHROME_CONTENT_PREFS)
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        chrome_options.add_argument('--disable-extensions')
+        chrome_options.add_argument('--disable-background-networking')
+        chrome_options.add_argument('--disable-sync')
+        # Return from get() once the DOM is ready; results are awaited explicitly
+        chrome_options.page_load_strategy = 'eager'
+        
+        if self.remote_url is None:
+            if self.profile_dir is not None:
+                # Chrome locks its profile, so each pooled browser gets its own;
+                # cookies and consent state then carry over to the next run
+                with self._session_lock:
+                    while True:
+                        profile = self.profile_dir / str(self._profiles_in_use)
+                        self._profiles_in_use += 1
+                        if self._claim_profile(profile):
+                            break
+                        logger.warning(f"Chrome profile {profile} is in use by a running browser; skipping it")
+                chrome_options.add_argument(f'--user-data-dir={profile}')
+                chrome_options.add_argument(f'--disk-cache-size={CHROME_DISK_CACHE_BYTES}')
+            driver = webdriver.Chrome(options=chrome_options)
             logger.info("Chrome WebDriver initialized")
+            return driver
+        
+        while self.reuse_session:
+            with self._session_lock:
+                if not self._session_ids:
+                    break
+                session_id = self._session_ids.pop()
+            try:
+                driver = AttachedRemote(session_id, command_executor=self.remote_url, options=chrome_options)
+                logger.info(f"Reattached to WebDriver session {session_id}")
+                return driver
+            except WebDriverException:
+                logger.info(f"WebDriver session {session_id} is gone; discarding it")
         
-        return self.driver
+        driver = webdriver.Remote(command_executor=self.remote_url, options=chrome_options)
+        logger.info(f"Remote WebDriver session {driver.session_id} started")
+        return driver
     
     def close(self):
-        """Close the WebDriver."""
-        if self.driver:
-            self.driver.quit()
-            self.driver = None
-            logger.info("WebDriver closed")
+        """Close all pooled WebDrivers, or park remote sessions for reuse."""
+        if not self.reuse_session:
+            self.pool.close()
+            # Reuse the profiles from slot 0; any still held by a browser that
+            # failed to quit are skipped when claimed
+            with self._session_lock:
+                self._profiles_in_use = 0
+            return
+        
+        parked = []
+        
+        def park(driver):
+            # Leave the browser running; only clear state from this run
+            driver.delete_all_cookies()
+            parked.append(driver.session_id)
+        
+        self.pool.close(dispose=park)
+        with self._session_lock:
+            self._session_ids.extend(parked)
+            self._save_session_ids(self._session_ids)
+    
+    def _load_session_ids(self) -> List[str]:
+        """Load saved remote session IDs."""
+        try:
+            return self.session_file.read_text().split()
+        except FileNotFoundError:
+            return []
+        except OSError as e:
+            logger.warning(f"Could not read WebDriver sessions from {self.session_file}: {e}")
+            return []
+    
+    def _save_session_ids(self, session_ids: List[str]) -> None:
+        """Persist remote session IDs so a later run can reattach to them."""
+        try:
+            self.session_file.write_text('\n'.join(session_ids))
+        except OSError as e:
+            logger.warning(f"Could not save WebDriver sessions to {self.session_file}: {e}")
     
-    def search_google_flights(self, params: Dict) -> List[Dict]:
+    def search_google_flights(self, params: SearchParams, force_refresh: bool = False) -> List[Dict]:
         """
         Search for flights on Google Flights.
         
         Args:
-            params: Search parameters dictionary
+            params: Flight search parameters
+            force_refresh: Search the site even if recent results are cached
+            
+        Returns:
+            List of flight dictionaries
+        """
+        return self._search_dates(
+            'Google Flights', 'google_flights', params, GOOGLE_FLIGHTS_RESULTS,
+            self._build_google_flights_url, self._extract_google_flights_data, force_refresh
+        )
+    
+    def search_expedia(self, params: SearchParams, force_refresh: bool = False) -> List[Dict]:
+        """
+        Search for flights on Expedia.
+        
+        Args:
+            params: Flight search parameters
+            force_refresh: Search the site even if recent results are cached
             
         Returns:
             List of flight dictionaries
         """
+        return self._search_dates(
+            'Expedia', 'expedia', params, EXPEDIA_RESULTS,
+            self._build_expedia_url, self._extract_expedia_data, force_refresh
+        )
+    
+    def _search_dates(self, site: str, source: str, params: SearchParams, results_selector: str,
+                      build_url: Callable, extract: Callable, force_refresh: bool = False) -> List[Dict]:
+        """
+        Search every departure date on one site in parallel across the driver pool.
+        
+        Args:
+            site: Site name, for logging
+            source: Source identifier recorded on each flight and used in cache keys
+            params: Flight search parameters
+            results_selector: CSS selector that appears once results have loaded
+            build_url: Builds the search URL for one date pair
+            extract: Extracts flights from a loaded results page
+            force_refresh: Search the site even if recent results are cached
+            
+        Returns:
+            List of flight dictionaries for all dates
+        """
         flights = []
         
         try:
-            driver = self._get_driver()
+            date_pairs = self._date_pairs(params)
+            if not date_pairs:
+                return flights
             
-            # Generate date range for departure
-            dep_start = datetime.strptime(params['departure_date_start'], '%Y-%m-%d')
-            dep_end = datetime.strptime(params['departure_date_end'], '%Y-%m-%d')
-            
-            # Search for each departure date
-            current_date = dep_start
-            while current_date <= dep_end:
-                dep_date = current_date.strftime('%Y-%m-%d')
-                
-                # Calculate return dates
-                ret_start = datetime.strptime(params['return_date_start'], '%Y-%m-%d')
-                ret_end = datetime.strptime(params['return_date_end'], '%Y-%m-%d')
-                
-                # Use middle return date for simplicity
-                ret_date = (ret_start + (ret_end - ret_start) / 2).strftime('%Y-%m-%d')
-                
-                logger.info(f"Searching Google Flights: {params['departure_airport']} -> {params['destination_airport']} on {dep_date}")
-                
-                # Construct Google Flights URL
-                url = self._build_google_flights_url(
-                    params['departure_airport'],
-                    params['destination_airport'],
-                    dep_date,
-                    ret_date,
-                    params['passengers']
+            def search_one(date_pair: Tuple[str, str]) -> List[Dict]:
+                dep_date, ret_date = date_pair
+                key = (
+                    source, params.departure_airport, params.destination_airport,
+                    dep_date, ret_date, params.passengers
                 )
+                if not force_refresh:
+                    cached = self.cache.get(key)
+                    if cached is not None:
+                        logger.info(f"Using cached {site} results for {dep_date}")
+                        return cached
                 
-                try:
-                    driver.get(url)
-                    time.sleep(5)  # Wait for page load
-                    
-                    # Try to extract flight information
-                    flight_data = self._extract_google_flights_data(driver, dep_date, ret_date)
-                    flights.extend(flight_data)
-                    
-                except Exception as e:
-                    logger.error(f"Error searching Google Flights for {dep_date}: {e}")
+                date_flights = self._search_one_date(
+                    site, params, dep_date, ret_date, results_selector, build_url, extract
+                )
+                if date_flights is None:
+                    return []
                 
-                current_date += timedelta(days=1)
-                time.sleep(2)  # Rate limiting
+                # Record the query on each flight so saved results can serve later lookups
+                for flight in date_flights:
+                    flight.update(
+                        origin=params.departure_airport,
+                        destination=params.destination_airport,
+                        passengers=params.passengers
+                    )
+                self.cache.put(key, date_flights)
+                return date_flights
+            
+            workers = min(self.pool.pool_size, len(date_pairs))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for date_flights in executor.map(search_one, date_pairs):
+                    flights.extend(date_flights)
             
         except Exception as e:
-            logger.error(f"Error in Google Flights search: {e}", exc_info=True)
+            logger.error(f"Error in {site} search: {e}", exc_info=True)
         
         return flights
     
-    def search_expedia(self, params: Dict) -> List[Dict]:
+    def _search_one_date(self, site: str, params: SearchParams, dep_date: str, ret_date: str,
+                         results_selector: str, build_url: Callable, extract: Callable) -> Optional[List[Dict]]:
         """
-        Search for flights on Expedia.
+        Load and extract the results page for one date pair on a pooled driver.
         
-        Args:
-            params: Search parameters dictionary
-            
         Returns:
-            List of flight dictionaries
+            List of flight dictionaries, or None if the search failed
         """
-        flights = []
+        logger.info(f"Searching {site}: {params.departure_airport} -> {params.destination_airport} on {dep_date}")
+        
+        url = build_url(
+            params.departure_airport,
+            params.destination_airport,
+            dep_date,
+            ret_date,
+            params.passengers
+        )
         
         try:
-            driver = self._get_driver()
-            
-            # Generate date range for departure
-            dep_start = datetime.strptime(params['departure_date_start'], '%Y-%m-%d')
-            dep_end = datetime.strptime(params['departure_date_end'], '%Y-%m-%d')
-            
-            # Search for each departure date
-            current_date = dep_start
-            while current_date <= dep_end:
-                dep_date = current_date.strftime('%Y-%m-%d')
-                
-                # Calculate return dates
-                ret_start = datetime.strptime(params['return_date_start'], '%Y-%m-%d')
-                ret_end = datetime.strptime(params['return_date_end'], '%Y-%m-%d')
-                
-                # Use middle return date for simplicity
-                ret_date = (ret_start + (ret_end - ret_start) / 2).strftime('%Y-%m-%d')
-                
-                logger.info(f"Searching Expedia: {params['departure_airport']} -> {params['destination_airport']} on {dep_date}")
-                
-                # Construct Expedia URL
-                url = self._build_expedia_url(
-                    params['departure_airport'],
-                    params['destination_airport'],
-                    dep_date,
-                    ret_date,
-                    params['passengers']
-                )
+            # Politeness: cap and space out page loads to the same site, so
+            # parallelism comes from searching different sites at once
+            with self.rate_limiter.request(urlparse(url).netloc), self.pool.driver() as driver:
+                driver.get(url)
                 
+                # Extract as soon as results render instead of sleeping a fixed time
                 try:
-                    driver.get(url)
-                    time.sleep(5)  # Wait for page load
-                    
-                    # Try to extract flight information
-                    flight_data = self._extract_expedia_data(driver, dep_date, ret_date)
-                    flights.extend(flight_data)
-                    
-                except Exception as e:
-                    logger.error(f"Error searching Expedia for {dep_date}: {e}")
+                    WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, results_selector))
+                    )
+                except TimeoutException:
+                    # Nothing to extract; treated as a failed search so it isn't cached
+                    logger.warning(f"Timeout waiting for {site} results for {dep_date}")
+                    return None
                 
-                current_date += timedelta(days=1)
-                time.sleep(2)  # Rate limiting
-            
+                # Try to extract flight information
+                return extract(driver, dep_date, ret_date)
         except Exception as e:
-            logger.error(f"Error in Expedia search: {e}", exc_info=True)
+            logger.error(f"Error searching {site} for {dep_date}: {e}")
+            return None
+    
+    def _date_pairs(self, params: SearchParams) -> List[Tuple[str, str]]:
+        """Build the (departure_date, return_date) pairs to search."""
+        dep_start = datetime.strptime(params.departure_date_start, '%Y-%m-%d')
+        dep_end = datetime.strptime(params.departure_date_end, '%Y-%m-%d')
         
-        return flights
+        # Use middle return date for simplicity
+        ret_start = datetime.strptime(params.return_date_start, '%Y-%m-%d')
+        ret_end = datetime.strptime(params.return_date_end, '%Y-%m-%d')
+        ret_date = (ret_start + (ret_end - ret_start) / 2).strftime('%Y-%m-%d')
+        
+        return [
+            ((dep_start + timedelta(days=i)).strftime('%Y-%m-%d'), ret_date)
+            for i in range((dep_end - dep_start).days + 1)
+        ]
     
     def _build_google_flights_url(self, origin: str, dest: str, dep_date: str, ret_date: str, passengers: int) -> str:
         """Build Google Flights search URL."""
@@ -175,44 +588,35 @@ class FlightSearcher:
     
     def _build_expedia_url(self, origin: str, dest: str, dep_date: str, ret_date: str, passengers: int) -> str:
         """Build Expedia search URL."""
-        # Convert date format for Expedia
-        dep = datetime.strptime(dep_date, '%Y-%m-%d').strftime('%m/%d/%Y')
-        ret = datetime.strptime(ret_date, '%Y-%m-%d').strftime('%m/%d/%Y')
+        # Convert YYYY-MM-DD to Expedia's MM/DD/YYYY without re-parsing the dates
+        dep = f"{dep_date[5:7]}/{dep_date[8:10]}/{dep_date[:4]}"
+        ret = f"{ret_date[5:7]}/{ret_date[8:10]}/{ret_date[:4]}"
         return f"https://www.expedia.com/Flights-Search?trip=roundtrip&leg1=from:{origin},to:{dest},departure:{dep}&leg2=from:{dest},to:{origin},departure:{ret}&passengers=adults:{passengers}"
     
+    def _result_texts(self, driver, selector: str, limit: int = 5) -> List[str]:
+        """Read the text of the first matching result elements in a single WebDriver call."""
+        return driver.execute_script(RESULT_TEXTS_SCRIPT, selector, limit) or []
+    
     def _extract_google_flights_data(self, driver, dep_date: str, ret_date: str) -> List[Dict]:
         """Extract flight data from Google Flights page."""
         flights = []
+        timestamp = datetime.now().isoformat()
         
         try:
-            # Wait for results to load
-            wait = WebDriverWait(driver, 10)
-            
             # This is a simplified extraction - actual selectors may vary
             # Google Flights uses dynamic content, so this is a basic approach
             
-            # Try to find price elements (these selectors are examples and may need adjustment)
-            price_elements = driver.find_elements(By.CSS_SELECTOR, "[role='listitem']")
-            
-            for idx, element in enumerate(price_elements[:5]):  # Limit to first 5
-                try:
-                    # Extract basic information - actual implementation would need proper selectors
-                    text = element.text
-                    
-                    # Create a flight entry (this is simplified)
-                    flights.append({
-                        'source': 'google_flights',
-                        'departure_date': dep_date,
-                        'return_date': ret_date,
-                        'price': None,  # Would extract from text
-                        'airline': 'Various',  # Would extract from elements
-                        'duration': 'Unknown',  # Would extract from elements
-                        'stops': 'Unknown',  # Would extract from elements
-                        'raw_data': text[:200] if text else '',
-                        'timestamp': datetime.now().isoformat()
-                    })
-                except Exception as e:
-                    logger.debug(f"Error extracting flight {idx}: {e}")
+            # Read the first 5 results (these selectors are examples and may need adjustment)
+            for text in self._result_texts(driver, GOOGLE_FLIGHTS_RESULTS):
+                # Create a flight entry (this is simplified)
+                flights.append({
+                    **FLIGHT_RECORD_TEMPLATE,
+                    'source': 'google_flights',
+                    'departure_date': dep_date,
+                    'return_date': ret_date,
+                    'raw_data': text,
+                    'timestamp': timestamp
+                })
             
             if not flights:
                 # If no structured data found, create a placeholder entry
@@ -223,11 +627,9 @@ class FlightSearcher:
                     'price': None,
                     'airline': 'Search completed',
                     'note': 'Manual verification needed - automated extraction requires further development',
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': timestamp
                 })
                 
-        except TimeoutException:
-            logger.warning("Timeout waiting for Google Flights results")
         except Exception as e:
             logger.error(f"Error extracting Google Flights data: {e}")
         
@@ -236,35 +638,23 @@ class FlightSearcher:
     def _extract_expedia_data(self, driver, dep_date: str, ret_date: str) -> List[Dict]:
         """Extract flight data from Expedia page."""
         flights = []
+        timestamp = datetime.now().isoformat()
         
         try:
-            # Wait for results to load
-            wait = WebDriverWait(driver, 10)
-            
             # This is a simplified extraction - actual selectors may vary
             # Expedia structure changes frequently, so this is a basic approach
             
-            # Try to find flight listings
-            flight_elements = driver.find_elements(By.CSS_SELECTOR, "[data-test-id*='offer']")
-            
-            for idx, element in enumerate(flight_elements[:5]):  # Limit to first 5
-                try:
-                    text = element.text
-                    
-                    # Create a flight entry (this is simplified)
-                    flights.append({
-                        'source': 'expedia',
-                        'departure_date': dep_date,
-                        'return_date': ret_date,
-                        'price': None,  # Would extract from text
-                        'airline': 'Various',  # Would extract from elements
-                        'duration': 'Unknown',  # Would extract from elements
-                        'stops': 'Unknown',  # Would extract from elements
-                        'raw_data': text[:200] if text else '',
-                        'timestamp': datetime.now().isoformat()
-                    })
-                except Exception as e:
-                    logger.debug(f"Error extracting flight {idx}: {e}")
+            # Read the first 5 flight listings
+            for text in self._result_texts(driver, EXPEDIA_RESULTS):
+                # Create a flight entry (this is simplified)
+                flights.append({
+                    **FLIGHT_RECORD_TEMPLATE,
+                    'source': 'expedia',
+                    'departure_date': dep_date,
+                    'return_date': ret_date,
+                    'raw_data': text,
+                    'timestamp': timestamp
+                })
             
             if not flights:
                 # If no structured data found, create a placeholder entry
@@ -275,11 +665,9 @@ class FlightSearcher:
                     'price': None,
                     'airline': 'Search completed',
                     'note': 'Manual verification needed - automated extraction requires further development',
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': timestamp
                 })
                 
-        except TimeoutException:
-            logger.warning("Timeout waiting for Expedia results")
         except Exception as e:
             logger.error(f"Error extracting Expedia data: {e}")
         
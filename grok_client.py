@@ -2,80 +2,202 @@
 Grok API Client for interacting with Grok AI.
 """
 
-import json
+import time
+import hashlib
 import logging
-from typing import Dict, Optional
-from openai import OpenAI
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Union
+import orjson
+import openai
+from openai import DefaultHttpxClient, OpenAI
+
+from config import SearchParams
 
 logger = logging.getLogger(__name__)
 
+# Keep idle connections long enough to be reused between the calls of one run
+# (built from openai's own Limits type so it matches the HTTP library openai uses)
+GROK_HTTP_LIMITS = type(openai.DEFAULT_CONNECTION_LIMITS)(
+    max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0
+)
+# Streamed responses only need the read timeout to cover the gap between chunks
+GROK_HTTP_TIMEOUT = openai.Timeout(60.0, connect=5.0)
+
+# How long a cached response to an identical prompt is reused
+RESPONSE_CACHE_TTL = 12 * 60 * 60
+
+ANALYSIS_SYSTEM_PROMPT = "You are a helpful AI assistant specializing in flight search and travel optimization. Provide clear, actionable recommendations based on the data provided."
+SEARCH_SYSTEM_PROMPT = "You are a helpful flight search assistant with access to real-time flight data. Provide detailed, accurate flight recommendations."
+
 
 class GrokClient:
     """Client for interacting with Grok AI API."""
     
-    def __init__(self, api_key: str, api_base: str = "https://api.x.ai/v1"):
+    def __init__(self, api_key: str, api_base: str = "https://api.x.ai/v1", model: str = "grok-3"):
         """
         Initialize Grok client.
         
         Args:
             api_key: Grok API key
             api_base: API base URL
+            model: Grok model name
         """
+        # One long-lived HTTP/2 connection pool, shared by every call and thread
         self.client = OpenAI(
             api_key=api_key,
-            base_url=api_base
+            base_url=api_base,
+            http_client=DefaultHttpxClient(
+                http2=True,
+                limits=GROK_HTTP_LIMITS,
+                timeout=GROK_HTTP_TIMEOUT
+            )
+        )
+        self.model = model
+        self._response_cache = {}
+        self._cache_lock = threading.Lock()
+        logger.info(f"Grok client initialized with model {model}")
+    
+    def close(self) -> None:
+        """Close the underlying HTTP connection pool."""
+        self.client.close()
+    
+    def __enter__(self) -> 'GrokClient':
+        """Use the client as a context manager."""
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        """Close the client on leaving the context."""
+        self.close()
+    
+    def _stream(self, system_prompt: str, prompt: str, temperature: float) -> Iterator[str]:
+        """Send one streaming chat completion request and yield text as it arrives."""
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=temperature,
+            stream=True
         )
-        self.model = "grok-3"
-        logger.info("Grok client initialized")
+        with stream:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+    
+    def _complete(self, system_prompt: str, prompt: str, temperature: float) -> str:
+        """Send one chat completion request and return the full response text."""
+        return ''.join(self._stream(system_prompt, prompt, temperature))
     
-    def analyze(self, prompt: str, temperature: float = 0.7) -> Dict:
+    def analyze(self, prompt: str, temperature: float = 0.7, use_cache: bool = False) -> Dict:
         """
         Analyze data using Grok AI.
         
         Args:
             prompt: The prompt to send to Grok
             temperature: Sampling temperature (0-1)
+            use_cache: Reuse a recent response to the identical prompt; only
+                for prompts whose input fully determines the answer
             
         Returns:
             Dict containing the analysis results
         """
+        key = None
+        if use_cache:
+            key = hashlib.blake2b(
+                f"{self.model}|{temperature}|{prompt}".encode(), digest_size=16
+            ).hexdigest()
+            now = time.monotonic()
+            with self._cache_lock:
+                cached = self._response_cache.get(key)
+                if cached and now - cached[0] < RESPONSE_CACHE_TTL:
+                    logger.info("Reusing cached Grok response for identical prompt")
+                    return cached[1]
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful AI assistant specializing in flight search and travel optimization. Provide clear, actionable recommendations based on the data provided."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=temperature
-            )
-            
-            result = response.choices[0].message.content
+            result = self._complete(ANALYSIS_SYSTEM_PROMPT, prompt, temperature)
             
             # Try to parse as JSON if possible, otherwise return as text
             try:
-                return json.loads(result)
-            except json.JSONDecodeError:
-                return {
+                parsed = orjson.loads(result)
+            except orjson.JSONDecodeError:
+                parsed = {
                     "recommendation": result,
                     "raw_response": result
                 }
-                
+            
+            if key is not None:
+                now = time.monotonic()
+                with self._cache_lock:
+                    # Drop expired entries so the cache doesn't grow unbounded
+                    self._response_cache = {
+                        k: v for k, v in self._response_cache.items()
+                        if now - v[0] < RESPONSE_CACHE_TTL
+                    }
+                    self._response_cache[key] = (now, parsed)
+            return parsed
+            
         except Exception as e:
             logger.error(f"Error calling Grok API: {e}", exc_info=True)
             raise
     
-    def search_flights(self, search_params: Dict) -> str:
+    def analyze_stream(self, prompt: str, temperature: float = 0.7) -> Iterator[str]:
+        """
+        Analyze data using Grok AI, yielding the response text as it is generated.
+        
+        Args:
+            prompt: The prompt to send to Grok
+            temperature: Sampling temperature (0-1)
+            
+        Yields:
+            Chunks of response text
+        """
+        try:
+            yield from self._stream(ANALYSIS_SYSTEM_PROMPT, prompt, temperature)
+        except Exception as e:
+            logger.error(f"Error streaming from Grok API: {e}", exc_info=True)
+            raise
+    
+    def analyze_many(self, prompts: List[str], temperature: float = 0.7) -> List[Union[Dict, Exception]]:
+        """
+        Analyze several independent prompts concurrently.
+        
+        Requests are multiplexed over the shared HTTP/2 connection, so the
+        total time is close to that of the slowest prompt.
+        
+        Args:
+            prompts: Prompts to send to Grok
+            temperature: Sampling temperature (0-1)
+            
+        Returns:
+            One result per prompt, in order; a failed prompt yields its exception
+        """
+        if not prompts:
+            return []
+        
+        def analyze_one(prompt: str) -> Union[Dict, Exception]:
+            try:
+                return self.analyze(prompt, temperature)
+            except Exception as e:
+                return e
+        
+        # More threads than pooled connections would only wait on the pool
+        with ThreadPoolExecutor(max_workers=min(len(prompts), GROK_HTTP_LIMITS.max_connections)) as executor:
+            return list(executor.map(analyze_one, prompts))
+    
+    def search_flights(self, search_params: SearchParams) -> str:
         """
         Ask Grok AI to search for flights and provide recommendations.
         
         Args:
-            search_params: Dictionary containing search parameters
+            search_params: Flight search parameters
             
         Returns:
             Grok's flight search results and recommendations
@@ -83,11 +205,11 @@ class GrokClient:
         prompt = f"""
 You are a flight search assistant. Please search for flights with the following criteria:
 
-Route: {search_params['departure_airport']} to {search_params['destination_airport']}
-Departure Date Range: {search_params['departure_date_start']} to {search_params['departure_date_end']}
-Return Date Range: {search_params['return_date_start']} to {search_params['return_date_end']}
-Passengers: {search_params['passengers']}
-Class: {search_params['travel_class']}
+Route: {search_params.departure_airport} to {search_params.destination_airport}
+Departure Date Range: {search_params.departure_date_start} to {search_params.departure_date_end}
+Return Date Range: {search_params.return_date_start} to {search_params.return_date_end}
+Passengers: {search_params.passengers}
+Class: {search_params.travel_class}
 
 Please:
 1. Search for flights on Google Flights and Expedia for all dates in the departure range
@@ -110,22 +232,7 @@ Format your response clearly with sections for:
 """
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful flight search assistant with access to real-time flight data. Provide detailed, accurate flight recommendations."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.7
-            )
-            
-            result = response.choices[0].message.content
+            result = self._complete(SEARCH_SYSTEM_PROMPT, prompt, 0.7)
             logger.info("Grok flight search completed")
             return result
             
@@ -143,9 +250,18 @@ Format your response clearly with sections for:
         Returns:
             Summary text
         """
+        # Nothing to compare for zero or one option, so skip the API call
+        if not flights:
+            return "No flight options found."
+        if len(flights) == 1:
+            flight = flights[0]
+            return f"1 option: {flight.get('airline', 'Unknown airline')} at {flight.get('price') or 'unknown price'}"
+        
+        # Compact JSON keeps the prompt's token count down
+        flights_json = orjson.dumps(flights).decode()
         prompt = f"""
 Summarize these flight options concisely:
-{json.dumps(flights, indent=2)}
+{flights_json}
 
 Provide a brief summary highlighting:
 - Number of options
@@ -153,7 +269,8 @@ Provide a brief summary highlighting:
 - Best value option
 """
         try:
-            response = self.analyze(prompt)
+            # The summary depends only on the flights, so an unchanged list reuses it
+            response = self.analyze(prompt, use_cache=True)
             return response.get("recommendation", "")
         except Exception as e:
             logger.error(f"Error summarizing flights: {e}")
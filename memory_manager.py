@@ -2,17 +2,28 @@
 Memory Manager for storing and retrieving flight search history.
 """
 
-import json
+import os
+import orjson
 import logging
+import sqlite3
+import threading
+import time
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
 
 class MemoryManager:
-    """Manages persistent storage of flight search data."""
+    """
+    Manages persistent storage of flight search data.
+    
+    Flight and analysis records are appended to JSONL files and located
+    through a SQLite index of (timestamp, offset, length), so saving a run
+    never rewrites earlier history and reading one record never loads the
+    rest. Price statistics are kept in SQLite.
+    """
     
     def __init__(self, data_dir: str = "/app/data"):
         """
@@ -24,9 +35,34 @@ class MemoryManager:
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
-        self.flights_file = self.data_dir / "flights_history.json"
-        self.analysis_file = self.data_dir / "analysis_history.json"
-        self.prices_file = self.data_dir / "price_tracking.json"
+        self.flights_file = self.data_dir / "flights_history.jsonl"
+        self.analysis_file = self.data_dir / "analysis_history.jsonl"
+        self.index_file = self.data_dir / "index.db"
+        
+        # Search threads read cached flights while the main thread writes
+        self._lock = threading.Lock()
+        self._append_files = {}
+        # Newest record line per table and the encoded price summary, kept current
+        # on write; each read decodes them, so callers get their own copies
+        self._latest = {}
+        self._prices = None
+        self._db = sqlite3.connect(self.index_file, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS flights (ts TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS flights_ts ON flights (ts);
+            CREATE TABLE IF NOT EXISTS analyses (ts TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS analyses_ts ON analyses (ts);
+            CREATE TABLE IF NOT EXISTS prices (
+                ts TEXT NOT NULL, min_price REAL, max_price REAL, avg_price REAL, num_flights INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY, cached_at REAL NOT NULL, analyses BLOB NOT NULL
+            );
+        """)
+        self._db.commit()
+        self._migrate_legacy_json()
         
         logger.info(f"Memory manager initialized with data directory: {data_dir}")
     
@@ -39,12 +75,10 @@ class MemoryManager:
             flights: List of flight dictionaries
         """
         try:
-            history = self._load_json(self.flights_file, default={})
-            history[timestamp] = flights
-            self._save_json(self.flights_file, history)
-            
-            # Update price tracking
-            self._update_price_tracking(timestamp, flights)
+            with self._lock:
+                self._append_record(self.flights_file, 'flights', timestamp, flights)
+                self._update_price_tracking(timestamp, flights)
+                self._db.commit()
             
             logger.info(f"Saved {len(flights)} flights for {timestamp}")
         except Exception as e:
@@ -59,9 +93,9 @@ class MemoryManager:
             analysis: Analysis dictionary
         """
         try:
-            history = self._load_json(self.analysis_file, default={})
-            history[timestamp] = analysis
-            self._save_json(self.analysis_file, history)
+            with self._lock:
+                self._append_record(self.analysis_file, 'analyses', timestamp, analysis)
+                self._db.commit()
             logger.info(f"Saved analysis for {timestamp}")
         except Exception as e:
             logger.error(f"Error saving analysis: {e}", exc_info=True)
@@ -77,8 +111,33 @@ class MemoryManager:
             Dictionary of price history
         """
         try:
-            prices = self._load_json(self.prices_file, default={})
-            return prices
+            with self._lock:
+                if self._prices is not None:
+                    return orjson.loads(self._prices)
+                min_price, max_price = self._db.execute(
+                    "SELECT MIN(min_price), MAX(max_price) FROM prices"
+                ).fetchone()
+                rows = self._db.execute(
+                    "SELECT ts, min_price, max_price, avg_price, num_flights FROM prices ORDER BY ts"
+                ).fetchall()
+                
+                prices = {
+                    "min_price": min_price,
+                    "max_price": max_price,
+                    "avg_prices": [row[3] for row in rows],
+                    "history": [
+                        {
+                            "timestamp": ts,
+                            "min_price": row_min,
+                            "max_price": row_max,
+                            "avg_price": avg,
+                            "num_flights": num_flights
+                        }
+                        for ts, row_min, row_max, avg, num_flights in rows
+                    ]
+                }
+                self._prices = orjson.dumps(prices)
+                return prices
         except Exception as e:
             logger.error(f"Error loading price history: {e}")
             return {}
@@ -91,16 +150,57 @@ class MemoryManager:
             List of flight dictionaries or None
         """
         try:
-            history = self._load_json(self.flights_file, default={})
-            if not history:
-                return None
-            
-            latest_timestamp = max(history.keys())
-            return history[latest_timestamp]
+            return self._read_latest(self.flights_file, 'flights')
         except Exception as e:
             logger.error(f"Error loading latest flights: {e}")
             return None
     
+    def get_cached_flights(self, source: str, origin: str, destination: str, departure_date: str,
+                           return_date: str, passengers: int, max_age: float) -> Optional[List[Dict]]:
+        """
+        Get saved flights for a search query that were scraped within max_age.
+        
+        Freshness is judged by each flight's own scrape timestamp, so results
+        re-saved by a later run aren't treated as newer than they are.
+        
+        Args:
+            source: Flight source identifier (e.g. 'google_flights')
+            origin: Departure airport code
+            destination: Destination airport code
+            departure_date: Departure date (YYYY-MM-DD)
+            return_date: Return date (YYYY-MM-DD)
+            passengers: Number of passengers
+            max_age: Maximum age of the saved results in seconds
+            
+        Returns:
+            List of flight dictionaries or None if no fresh results are saved
+        """
+        try:
+            cutoff = (datetime.now() - timedelta(seconds=max_age)).isoformat()
+            # A run saved before the cutoff can only hold scrapes older than it
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT offset, length FROM flights WHERE ts > ? ORDER BY ts DESC", (cutoff,)
+                ).fetchall()
+            
+            for offset, length in rows:
+                flights = [
+                    f for f in self._read_record(self.flights_file, offset, length)
+                    if f.get('source') == source
+                    and f.get('origin') == origin
+                    and f.get('destination') == destination
+                    and f.get('departure_date') == departure_date
+                    and f.get('return_date') == return_date
+                    and f.get('passengers') == passengers
+                    and f.get('timestamp', '') > cutoff
+                ]
+                if flights:
+                    return flights
+            return None
+        except Exception as e:
+            logger.error(f"Error loading cached flights: {e}")
+            return None
+    
     def get_latest_analysis(self) -> Optional[Dict]:
         """
         Get the most recent analysis.
@@ -109,72 +209,166 @@ class MemoryManager:
             Analysis dictionary or None
         """
         try:
-            history = self._load_json(self.analysis_file, default={})
-            if not history:
-                return None
-            
-            latest_timestamp = max(history.keys())
-            return history[latest_timestamp]
+            return self._read_latest(self.analysis_file, 'analyses')
         except Exception as e:
             logger.error(f"Error loading latest analysis: {e}")
             return None
     
+    def get_cached_analysis(self, key: str, max_age: float) -> Optional[List[Dict]]:
+        """
+        Get a cached Grok analysis stored within max_age.
+        
+        Args:
+            key: Cache key of the analysis inputs
+            max_age: Maximum age of the cached analysis in seconds
+            
+        Returns:
+            List of analysis dictionaries or None on a miss
+        """
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT analyses FROM analysis_cache WHERE key = ? AND cached_at > ?",
+                    (key, time.time() - max_age)
+                ).fetchone()
+            return orjson.loads(row[0]) if row else None
+        except Exception as e:
+            logger.error(f"Error loading cached analysis: {e}")
+            return None
+    
+    def save_cached_analysis(self, key: str, analyses: List[Dict], max_age: float) -> None:
+        """
+        Cache a Grok analysis, dropping entries older than max_age in the same transaction.
+        
+        Args:
+            key: Cache key of the analysis inputs
+            analyses: List of analysis dictionaries
+            max_age: Age in seconds after which cached analyses are dropped
+        """
+        try:
+            now = time.time()
+            with self._lock, self._db:
+                self._db.execute("DELETE FROM analysis_cache WHERE cached_at <= ?", (now - max_age,))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, cached_at, analyses) VALUES (?, ?, ?)",
+                    (key, now, orjson.dumps(analyses))
+                )
+        except Exception as e:
+            logger.error(f"Error saving cached analysis: {e}")
+    
+    def close(self) -> None:
+        """Flush and sync the history files and close the index."""
+        with self._lock:
+            for f in self._append_files.values():
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+            self._append_files.clear()
+            self._db.close()
+    
+    def _append_record(self, file_path: Path, table: str, timestamp: str, data) -> None:
+        """Append one record to a JSONL file and index its position; caller holds the lock."""
+        f = self._append_files.get(file_path)
+        if f is None:
+            f = self._append_files[file_path] = open(file_path, 'ab')
+        
+        line = orjson.dumps({"timestamp": timestamp, "data": data}, option=orjson.OPT_APPEND_NEWLINE)
+        offset = f.tell()
+        f.write(line)
+        # Make the record visible to readers; fsync is left to close()
+        f.flush()
+        self._db.execute(
+            f"INSERT INTO {table} (ts, offset, length) VALUES (?, ?, ?)",
+            (timestamp, offset, len(line))
+        )
+        
+        # Serve the next get_latest_* from memory; an unknown latest is left to the index
+        latest = self._latest.get(table)
+        if latest is not None and timestamp >= latest[0]:
+            self._latest[table] = (timestamp, line)
+    
+    def _read_latest(self, file_path: Path, table: str):
+        """Read the data of the newest record in an indexed JSONL file, or None."""
+        with self._lock:
+            latest = self._latest.get(table)
+            if latest is None:
+                row = self._db.execute(
+                    f"SELECT ts, offset, length FROM {table} ORDER BY ts DESC LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                latest = self._latest[table] = (row[0], self._read_line(file_path, row[1], row[2]))
+            return orjson.loads(latest[1])["data"]
+    
+    def _read_line(self, file_path: Path, offset: int, length: int) -> bytes:
+        """Read a single JSONL line at a known position."""
+        with open(file_path, 'rb') as f:
+            return os.pread(f.fileno(), length, offset)
+    
+    def _read_record(self, file_path: Path, offset: int, length: int):
+        """Read and decode a single JSONL record at a known position."""
+        return orjson.loads(self._read_line(file_path, offset, length))["data"]
+    
     def _update_price_tracking(self, timestamp: str, flights: List[Dict]) -> None:
         """
-        Update price tracking with new flight data.
+        Record price statistics for new flight data; caller holds the lock.
         
         Args:
             timestamp: ISO format timestamp
             flights: List of flight dictionaries
         """
         try:
-            prices = self._load_json(self.prices_file, default={
-                "min_price": None,
-                "max_price": None,
-                "avg_prices": [],
-                "history": []
-            })
+            # One pass over the flights for count, min, max and total
+            count = 0
+            min_price = max_price = total = 0
+            for flight in flights:
+                price = flight.get('price')
+                if not price:
+                    continue
+                if count == 0 or price < min_price:
+                    min_price = price
+                if count == 0 or price > max_price:
+                    max_price = price
+                total += price
+                count += 1
             
-            if flights:
-                flight_prices = [f.get('price', 0) for f in flights if f.get('price')]
-                if flight_prices:
-                    min_price = min(flight_prices)
-                    max_price = max(flight_prices)
-                    avg_price = sum(flight_prices) / len(flight_prices)
-                    
-                    prices["history"].append({
-                        "timestamp": timestamp,
-                        "min_price": min_price,
-                        "max_price": max_price,
-                        "avg_price": avg_price,
-                        "num_flights": len(flights)
-                    })
-                    
-                    # Update overall min/max
-                    if prices["min_price"] is None or min_price < prices["min_price"]:
-                        prices["min_price"] = min_price
-                    if prices["max_price"] is None or max_price > prices["max_price"]:
-                        prices["max_price"] = max_price
-                    
-                    prices["avg_prices"].append(avg_price)
-                    
-                    self._save_json(self.prices_file, prices)
+            if count:
+                self._prices = None
+                self._db.execute(
+                    "INSERT INTO prices (ts, min_price, max_price, avg_price, num_flights) VALUES (?, ?, ?, ?, ?)",
+                    (timestamp, min_price, max_price, total / count, len(flights))
+                )
         except Exception as e:
             logger.error(f"Error updating price tracking: {e}")
     
+    def _migrate_legacy_json(self) -> None:
+        """Import flights_history.json and analysis_history.json from older versions once."""
+        legacy_files = [
+            (self.data_dir / "flights_history.json", self.save_flight_data),
+            (self.data_dir / "analysis_history.json", self.save_analysis),
+        ]
+        for legacy_file, save in legacy_files:
+            history = self._load_json(legacy_file)
+            if history is None:
+                continue
+            for timestamp in sorted(history):
+                save(timestamp, history[timestamp])
+            legacy_file.rename(legacy_file.with_name(legacy_file.name + '.migrated'))
+            logger.info(f"Migrated {len(history)} records from {legacy_file}")
+        
+        # Price statistics are rebuilt from the migrated flights
+        legacy_prices = self.data_dir / "price_tracking.json"
+        if legacy_prices.exists():
+            legacy_prices.rename(legacy_prices.with_name(legacy_prices.name + '.migrated'))
+    
     def _load_json(self, file_path: Path, default=None):
         """Load JSON from file."""
         if not file_path.exists():
             return default
         
         try:
-            with open(file_path, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
+            return orjson.loads(file_path.read_bytes())
+        except orjson.JSONDecodeError:
             logger.warning(f"Invalid JSON in {file_path}, returning default")
             return default
-    
-    def _save_json(self, file_path: Path, data) -> None:
-        """Save data to JSON file."""
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2)
+
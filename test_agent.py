@@ -2,24 +2,131 @@
 Unit tests for the Flight Search AI Agent
 """
 
-import json
+import ast
+import mmap
+import multiprocessing
 import os
 import sys
 import tempfile
-from datetime import datetime
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable
+
+try:
+    import pytest
+except ImportError:  # Standalone runs don't need pytest
+    pytest = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
 
 # Add parent directory to path for imports
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+# Keep scratch data in RAM where a tmpfs is available
+RAM_TMPDIR = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+
+
+def _token_matcher(tokens: tuple) -> Callable[[mmap.mmap], list]:
+    """
+    Build a matcher specialized to a fixed token set.
+    
+    Tokens are encoded once, here; the matcher runs one C-level find()
+    per token, which beats a regex alternation for a handful of literals.
+    """
+    encoded = [(token, token.encode()) for token in tokens]
+    
+    def missing(buffer: mmap.mmap) -> list:
+        return [token for token, needle in encoded if buffer.find(needle) == -1]
+    
+    return missing
+
+
+def _open_repo_file(path: str):
+    """Open a repository file for binary reading, failing the test if it's missing."""
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        raise AssertionError(f"{os.path.basename(path)} not found") from None
+
+
+def _missing_tokens(path: str, matcher: Callable[[mmap.mmap], list]) -> list:
+    """Find which of a matcher's tokens don't occur in a file's memory-mapped bytes."""
+    with _open_repo_file(path) as f:
+        # An empty file can't be mapped, and contains none of the tokens anyway
+        if os.fstat(f.fileno()).st_size == 0:
+            return matcher(b'')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return matcher(mm)
+
+
+# Variables .env.example must define
+REQUIRED_ENV_VARS = (
+    'GROK_API_KEY',
+    'DEPARTURE_AIRPORT',
+    'DESTINATION_AIRPORT',
+    'DEPARTURE_DATE_START',
+    'RETURN_DATE_START',
+)
+
+# Instructions the Dockerfile must contain
+REQUIRED_DOCKERFILE_ELEMENTS = (
+    'FROM python',
+    'WORKDIR /app',
+    'COPY requirements.txt',
+    'RUN pip install',
+    'CMD ["python", "agent.py"]',
+)
+
+# Packages requirements.txt must list
+REQUIRED_PACKAGES = (
+    'requests',
+    'selenium',
+    'schedule',
+    'openai',
+    'python-dotenv',
+)
+
+# Methods FlightAgent must define
+REQUIRED_AGENT_METHODS = (
+    'search_flights',
+    'analyze_flights',
+    'run_daily_search',
+    'start',
+)
+
+# Specialized once at import
+MISSING_ENV_VARS = _token_matcher(REQUIRED_ENV_VARS)
+MISSING_DOCKERFILE_ELEMENTS = _token_matcher(REQUIRED_DOCKERFILE_ELEMENTS)
+MISSING_PACKAGES = _token_matcher(REQUIRED_PACKAGES)
+
+# (file name, kind of token for messages, matcher) checked by test_file_contains
+FILE_TOKEN_CASES = (
+    ('.env.example', 'variables', MISSING_ENV_VARS),
+    ('Dockerfile', 'elements', MISSING_DOCKERFILE_ELEMENTS),
+    ('requirements.txt', 'packages', MISSING_PACKAGES),
+)
+
+
+def structural(test):
+    """
+    Mark a test that only checks static repository files.
+    
+    Deselect them with `pytest -m "not structural"` or
+    `python3 test_agent.py --skip-structural`.
+    """
+    test.structural = True
+    return pytest.mark.structural(test) if pytest else test
+
 
 def test_memory_manager():
     """Test MemoryManager functionality."""
     print("Testing MemoryManager...")
     
+    import orjson
     from memory_manager import MemoryManager
     
     # Create a temporary directory for testing
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with tempfile.TemporaryDirectory(dir=RAM_TMPDIR) as tmpdir:
         mm = MemoryManager(tmpdir)
         
         # Test saving flight data
@@ -35,9 +142,6 @@ def test_memory_manager():
         timestamp = datetime.now().isoformat()
         mm.save_flight_data(timestamp, test_flights)
         
-        # Verify file was created
-        assert (Path(tmpdir) / "flights_history.json").exists(), "flights_history.json not created"
-        
         # Test retrieving data
         latest = mm.get_latest_flights()
         assert latest is not None, "Failed to retrieve latest flights"
@@ -51,9 +155,6 @@ def test_memory_manager():
         }
         mm.save_analysis(timestamp, test_analysis)
         
-        # Verify analysis file was created
-        assert (Path(tmpdir) / "analysis_history.json").exists(), "analysis_history.json not created"
-        
         # Test retrieving analysis
         latest_analysis = mm.get_latest_analysis()
         assert latest_analysis is not None, "Failed to retrieve latest analysis"
@@ -62,126 +163,565 @@ def test_memory_manager():
         # Test price tracking
         price_data = mm.get_historical_prices()
         assert price_data is not None, "Failed to retrieve price history"
+        assert price_data['min_price'] == 500, "Min price mismatch"
+        
+        # Test that the newest record wins and older ones are kept
+        newer = datetime.now().isoformat()
+        mm.save_flight_data(newer, [dict(test_flights[0], price=450)])
+        assert mm.get_latest_flights()[0]['price'] == 450, "Latest flights mismatch"
+        assert mm.get_historical_prices()['max_price'] == 500, "Max price mismatch"
+        assert len(mm.get_historical_prices()['history']) == 2, "Expected 2 price records"
+        
+        # Test that mutating saved or returned data doesn't change later reads
+        saved = [dict(test_flights[0], price=440)]
+        mm.save_flight_data(datetime.now().isoformat(), saved)
+        saved[0]['price'] = 1
+        mm.get_latest_flights()[0]['price'] = 2
+        mm.get_latest_analysis()['recommendation'] = 'Wait'
+        mm.get_historical_prices()['history'].clear()
+        assert mm.get_latest_flights()[0]['price'] == 440, "Latest flights changed by a caller"
+        assert mm.get_latest_analysis()['recommendation'] == 'Book now', "Latest analysis changed by a caller"
+        assert len(mm.get_historical_prices()['history']) == 3, "Price history changed by a caller"
+        
+        # Test analysis cache persistence
+        assert mm.get_cached_analysis('abc', 60) is None, "Expected empty analysis cache"
+        mm.save_cached_analysis('abc', [test_analysis], 60)
+        assert mm.get_cached_analysis('abc', 60) == [test_analysis], "Analysis cache mismatch"
+        assert mm.get_cached_analysis('abc', 0) is None, "Expected expired analysis"
+        
+        mm.close()
+    
+    # Test one-time migration of the legacy JSON history files
+    with tempfile.TemporaryDirectory(dir=RAM_TMPDIR) as tmpdir:
+        legacy_flights = {
+            '2026-01-01T09:00:00': [dict(test_flights[0], price=620)],
+            '2026-01-02T09:00:00': [dict(test_flights[0], price=580)],
+        }
+        legacy_analyses = {'2026-01-02T09:00:00': test_analysis}
+        for name, history in (('flights_history.json', legacy_flights),
+                              ('analysis_history.json', legacy_analyses)):
+            with open(os.path.join(tmpdir, name), 'wb') as f:
+                f.write(orjson.dumps(history))
+        
+        mm = MemoryManager(tmpdir)
+        assert mm.get_latest_flights()[0]['price'] == 580, "Migrated latest flights mismatch"
+        assert mm.get_latest_analysis() == test_analysis, "Migrated analysis mismatch"
+        price_data = mm.get_historical_prices()
+        assert price_data['min_price'] == 580, "Migrated min price mismatch"
+        assert price_data['max_price'] == 620, "Migrated max price mismatch"
+        assert len(price_data['history']) == 2, "Expected 2 migrated price records"
+        for name in ('flights_history.json', 'analysis_history.json'):
+            assert not os.path.exists(os.path.join(tmpdir, name)), f"{name} was not renamed"
+            assert os.path.exists(os.path.join(tmpdir, name + '.migrated')), f"{name}.migrated missing"
+        mm.close()
         
     print("✓ MemoryManager tests passed")
 
 
-def test_configuration_structure():
-    """Test that configuration files are properly structured."""
-    print("Testing configuration files...")
+def test_flight_search_cache():
+    """Test FlightSearchCache eviction and expiry, and its MemoryManager fallback."""
+    print("Testing FlightSearchCache...")
+    
+    from flight_searcher import FlightSearchCache
+    from memory_manager import MemoryManager
     
-    # Test .env.example
-    env_example_path = Path(__file__).parent / ".env.example"
-    assert env_example_path.exists(), ".env.example not found"
+    # Least recently used entry is evicted once the cache is full
+    cache = FlightSearchCache(maxsize=2)
+    cache.put(('a',), [1])
+    cache.put(('b',), [2])
+    assert cache.get(('a',)) == [1], "Expected cached entry"
+    cache.put(('c',), [3])
+    assert cache.get(('b',)) is None, "Expected least recently used entry to be evicted"
+    assert cache.get(('a',)) == [1] and cache.get(('c',)) == [3], "Expected recent entries kept"
     
-    # Read and verify key variables are present
-    with open(env_example_path) as f:
-        content = f.read()
-        required_vars = [
-            'GROK_API_KEY',
-            'DEPARTURE_AIRPORT',
-            'DESTINATION_AIRPORT',
-            'DEPARTURE_DATE_START',
-            'RETURN_DATE_START'
-        ]
-        for var in required_vars:
-            assert var in content, f"Required variable {var} not found in .env.example"
+    # Entries expire after the TTL
+    cache = FlightSearchCache(ttl=0)
+    cache.put(('a',), [1])
+    assert cache.get(('a',)) is None, "Expected expired entry"
+    
+    with tempfile.TemporaryDirectory(dir=RAM_TMPDIR) as tmpdir:
+        mm = MemoryManager(tmpdir)
+        key = ('google_flights', 'IAD', 'IDR', '2026-06-15', '2026-07-01', 1)
+        flight = {
+            'source': 'google_flights',
+            'origin': 'IAD',
+            'destination': 'IDR',
+            'departure_date': '2026-06-15',
+            'return_date': '2026-07-01',
+            'passengers': 1,
+        }
+        max_age = 12 * 60 * 60
+        
+        # A stale scrape re-saved under a new run timestamp is still stale
+        stale = dict(flight, price=400, timestamp=(datetime.now() - timedelta(hours=13)).isoformat())
+        mm.save_flight_data(datetime.now().isoformat(), [stale])
+        assert mm.get_cached_flights(*key, max_age=max_age) is None, "Expected stale scrape to be ignored"
+        
+        fresh = dict(flight, price=450, timestamp=datetime.now().isoformat())
+        mm.save_flight_data(datetime.now().isoformat(), [fresh])
+        assert mm.get_cached_flights(*key, max_age=max_age) == [fresh], "Expected fresh scrape"
+        assert mm.get_cached_flights(*key[:-1], 2, max_age=max_age) is None, "Expected miss for other query"
+        
+        # The cache falls back to saved results on a memory miss
+        cache = FlightSearchCache(store=mm)
+        assert cache.get(key) == [fresh], "Expected fallback to saved results"
+        
+        mm.close()
     
-    print("✓ Configuration tests passed")
+    print("✓ FlightSearchCache tests passed")
 
 
-def test_dockerfile_structure():
-    """Test that Dockerfile is properly structured."""
-    print("Testing Dockerfile...")
+def test_chrome_profile_claim():
+    """Test that only Chrome profile locks left by dead or foreign browsers are cleared."""
+    print("Testing Chrome profile locks...")
     
-    dockerfile_path = Path(__file__).parent / "Dockerfile"
-    assert dockerfile_path.exists(), "Dockerfile not found"
+    import socket
+    import subprocess
+    from pathlib import Path
+    from flight_searcher import CHROME_SINGLETON_FILES, FlightSearcher
     
-    with open(dockerfile_path) as f:
-        content = f.read()
-        required_elements = [
-            'FROM python',
-            'WORKDIR /app',
-            'COPY requirements.txt',
-            'RUN pip install',
-            'CMD ["python", "agent.py"]'
-        ]
-        for element in required_elements:
-            assert element in content, f"Required element '{element}' not found in Dockerfile"
+    with tempfile.TemporaryDirectory(dir=RAM_TMPDIR) as tmpdir:
+        profile = Path(tmpdir)
+        
+        def lock(owner):
+            (profile / 'SingletonLock').symlink_to(owner)
+            for name in CHROME_SINGLETON_FILES[1:]:
+                (profile / name).touch()
+        
+        assert FlightSearcher._claim_profile(profile), "Expected unlocked profile to be free"
+        
+        # A lock from a previous container's hostname is stale
+        lock('old-container-1234')
+        assert FlightSearcher._claim_profile(profile), "Expected foreign-host lock to be cleared"
+        assert not any(profile.iterdir()), "Expected stale lock files to be removed"
+        
+        # A lock from a process on this host that has exited is stale
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        lock(f"{socket.gethostname()}-{exited.pid}")
+        assert FlightSearcher._claim_profile(profile), "Expected dead-PID lock to be cleared"
+        assert not any(profile.iterdir()), "Expected stale lock files to be removed"
+        
+        # A lock held by a running process on this host is kept
+        lock(f"{socket.gethostname()}-{os.getpid()}")
+        assert not FlightSearcher._claim_profile(profile), "Expected live lock to keep the profile busy"
+        assert (profile / 'SingletonLock').is_symlink(), "Expected live lock to be kept"
     
-    print("✓ Dockerfile tests passed")
+    print("✓ Chrome profile lock tests passed")
 
 
-def test_requirements_file():
-    """Test that requirements.txt contains necessary packages."""
-    print("Testing requirements.txt...")
+def test_webdriver_pool():
+    """Test that WebDriverPool bounds, recovers and closes its drivers."""
+    print("Testing WebDriverPool...")
     
-    req_path = Path(__file__).parent / "requirements.txt"
-    assert req_path.exists(), "requirements.txt not found"
+    import threading
+    import time
+    from flight_searcher import WebDriverPool
     
-    with open(req_path) as f:
-        content = f.read()
-        required_packages = [
-            'requests',
-            'selenium',
-            'schedule',
-            'openai',
-            'python-dotenv'
-        ]
-        for package in required_packages:
-            assert package in content, f"Required package '{package}' not found in requirements.txt"
+    class FakeDriver:
+        def __init__(self):
+            self.quits = 0
+        
+        def quit(self):
+            self.quits += 1
+    
+    created = []
+    lock = threading.Lock()
+    
+    def factory():
+        # Slow start-up widens the window for racing acquirers
+        time.sleep(0.01)
+        driver = FakeDriver()
+        with lock:
+            created.append(driver)
+        return driver
+    
+    # Concurrent borrowers never start more than pool_size browsers
+    pool = WebDriverPool(factory, pool_size=3)
+    in_use = 0
+    peak = 0
+    
+    def borrow():
+        nonlocal in_use, peak
+        with pool.driver():
+            with lock:
+                in_use += 1
+                peak = max(peak, in_use)
+            time.sleep(0.01)
+            with lock:
+                in_use -= 1
+    
+    threads = [threading.Thread(target=borrow) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 3, f"Expected 3 drivers, created {len(created)}"
+    assert peak <= 3, f"Expected at most 3 drivers in use, got {peak}"
     
-    print("✓ Requirements tests passed")
+    # close() quits every driver exactly once, including ones still borrowed
+    borrowed = pool.acquire()
+    pool.close()
+    pool.close()
+    assert borrowed in created, "Expected a pooled driver"
+    assert [driver.quits for driver in created] == [1, 1, 1], "Expected each driver to quit once"
+    
+    # dispose replaces quit()
+    disposed = []
+    created.clear()
+    pool = WebDriverPool(factory, pool_size=2)
+    pool.release(pool.acquire())
+    pool.close(dispose=disposed.append)
+    assert disposed == created and created[0].quits == 0, "Expected dispose instead of quit"
+    
+    # A failed start frees its slot, so the next acquire can start a browser
+    attempts = []
+    
+    def flaky_factory():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise RuntimeError("chromedriver crashed")
+        return FakeDriver()
+    
+    pool = WebDriverPool(flaky_factory, pool_size=1)
+    try:
+        pool.acquire()
+        raise AssertionError("Expected the factory error to propagate")
+    except RuntimeError:
+        pass
+    result = []
+    retry = threading.Thread(target=lambda: result.append(pool.acquire()), daemon=True)
+    retry.start()
+    retry.join(timeout=1)
+    assert result, "Expected the failed start to free its pool slot"
+    pool.close()
+    
+    print("✓ WebDriverPool tests passed")
 
 
+def test_rate_limiter():
+    """Test that RateLimiter caps concurrent requests per host and spaces their starts."""
+    print("Testing RateLimiter...")
+    
+    import threading
+    import time
+    from flight_searcher import RateLimiter
+    
+    min_interval = 0.05
+    limiter = RateLimiter(min_interval, max_concurrent=2)
+    starts = []
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+    
+    def request():
+        nonlocal in_flight, peak
+        with limiter.request('www.google.com'):
+            with lock:
+                starts.append(time.monotonic())
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.15)
+            with lock:
+                in_flight -= 1
+    
+    threads = [threading.Thread(target=request) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert peak <= 2, f"Expected at most 2 requests in flight, got {peak}"
+    # Each start is reserved at least min_interval after the one before it, and
+    # only ever wakes late, so the nth start is n intervals after the first
+    starts.sort()
+    offsets = [start - starts[0] for start in starts]
+    short = [i for i, offset in enumerate(offsets) if offset < i * min_interval - 0.001]
+    assert not short, f"Expected starts spaced by {min_interval}s, got offsets {offsets}"
+    
+    print("✓ RateLimiter tests passed")
+
+
+def test_grok_analyze_many():
+    """Test that analyze_many keeps input order, returns failures in place and bounds its threads."""
+    print("Testing GrokClient.analyze_many...")
+    
+    import threading
+    import time
+    from grok_client import GROK_HTTP_LIMITS, GrokClient
+    
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+    
+    def fake_analyze(prompt, temperature=0.7):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        try:
+            # Later prompts finish first, so order can't come from completion
+            time.sleep(0.01 if prompt == 'bad' else 0.05 - 0.0005 * int(prompt))
+            if prompt == 'bad':
+                raise ValueError("Grok returned invalid JSON")
+            return {'prompt': prompt}
+        finally:
+            with lock:
+                active -= 1
+    
+    client = GrokClient.__new__(GrokClient)
+    client.analyze = fake_analyze
+    
+    results = client.analyze_many(['0', 'bad', '2'])
+    assert results[0] == {'prompt': '0'} and results[2] == {'prompt': '2'}, f"Results out of order: {results}"
+    assert isinstance(results[1], ValueError), "Expected the failed prompt's exception in its slot"
+    assert client.analyze_many([]) == [], "Expected no results for no prompts"
+    
+    prompts = [str(i) for i in range(GROK_HTTP_LIMITS.max_connections + 16)]
+    results = client.analyze_many(prompts)
+    assert [r['prompt'] for r in results] == prompts, "Results out of order"
+    assert peak <= GROK_HTTP_LIMITS.max_connections, f"Expected at most {GROK_HTTP_LIMITS.max_connections} threads, got {peak}"
+    
+    print("✓ GrokClient.analyze_many tests passed")
+
+
+def test_email_html_escaping():
+    """Test that user-supplied values are escaped in HTML email bodies."""
+    print("Testing EmailClient HTML escaping...")
+    
+    from config import SearchParams
+    from email_client import EmailClient
+    
+    client = EmailClient()
+    search_params = SearchParams(
+        departure_airport='IAD',
+        destination_airport='<script>',
+        departure_date_start='2026-06-13',
+        departure_date_end='2026-06-17',
+        return_date_start='2026-06-30',
+        return_date_end='2026-07-05',
+        passengers=1,
+        travel_class='economy'
+    )
+    
+    text_body, html_body = client._render_grok_recommendations("Fly A&B\n<b>cheap</b>", search_params)
+    assert "Fly A&B\n<b>cheap</b>" in text_body, "Plain text body should not be escaped"
+    assert '<script>' not in html_body, "Search parameter not escaped"
+    assert '&lt;script&gt;' in html_body, "Escaped search parameter missing"
+    assert 'Fly A&amp;B<br>&lt;b&gt;cheap&lt;/b&gt;' in html_body, "Recommendations not escaped"
+    assert 'Economy' in html_body, "Travel class not title-cased"
+    
+    flights = [{'source': '<i>x</i>', 'date': '2026-06-13', 'price': 500}]
+    text_body, html_body = client._render_flight_analysis(flights, {'recommendation': 'a<b'}, search_params)
+    assert '&lt;i&gt;x&lt;/i&gt;' in html_body, "Flight source not escaped"
+    assert '<p>a&lt;b</p>' in html_body, "Analysis not escaped"
+    
+    print("✓ EmailClient escaping tests passed")
+
+
+def test_daily_search_analysis_failure():
+    """Test that a failed flight analysis still sends the Grok recommendations."""
+    print("Testing daily search with a failing analysis...")
+    
+    from agent import FlightAgent
+    from config import SearchParams
+    from memory_manager import MemoryManager
+    
+    class FailingGrok:
+        def search_flights(self, search_params):
+            return "Fly on Tuesday"
+        
+        def analyze(self, prompt):
+            raise RuntimeError("Grok API timed out")
+    
+    class RecordingEmail:
+        def __init__(self):
+            self.sent = []
+        
+        def send_flight_analysis(self, flights, analysis, search_params):
+            self.sent.append('analysis')
+        
+        def send_grok_recommendations(self, recommendations, search_params):
+            self.sent.append(recommendations)
+    
+    with tempfile.TemporaryDirectory(dir=RAM_TMPDIR) as tmpdir:
+        agent = FlightAgent.__new__(FlightAgent)
+        agent.grok_client = FailingGrok()
+        agent.email_client = RecordingEmail()
+        agent.memory_manager = MemoryManager(tmpdir)
+        agent.search_params = SearchParams('IAD', 'IDR', '2026-06-13', '2026-06-17',
+                                           '2026-06-30', '2026-07-05', 1, 'economy')
+        agent.search_flights = lambda: [{'source': 'test', 'price': 500}]
+        
+        agent.run_daily_search()
+        assert agent.email_client.sent == ["Fly on Tuesday"], \
+            f"Expected only the recommendations email, got {agent.email_client.sent}"
+        
+        agent.memory_manager.close()
+    
+    print("✓ Daily search failure tests passed")
+
+
+def test_analysis_cache_key():
+    """Test that the analysis cache key ignores timestamps, and how batched responses are split."""
+    print("Testing analysis cache key...")
+    
+    from agent import FlightAgent
+    from config import SearchParams
+    
+    agent = FlightAgent.__new__(FlightAgent)
+    params = SearchParams('IAD', 'IDR', '2026-06-13', '2026-06-17', '2026-06-30', '2026-07-05', 1, 'economy')
+    flight = {'source': 'google_flights', 'departure_date': '2026-06-15', 'price': 500}
+    history = {
+        'min_price': 450,
+        'max_price': 600,
+        'history': [{'timestamp': '2026-06-01T09:00:00', 'min_price': 450, 'max_price': 600}],
+    }
+    
+    # A later run of the same flights differs only in timestamps and a new price row
+    key = agent._analysis_cache_key([(params, [dict(flight, timestamp='2026-06-01T09:00:00')])], history)
+    next_history = dict(history, history=history['history'] + [
+        {'timestamp': '2026-06-02T09:00:00', 'min_price': 500, 'max_price': 500}
+    ])
+    next_key = agent._analysis_cache_key([(params, [dict(flight, timestamp='2026-06-02T09:00:00')])], next_history)
+    assert key == next_key, "Expected the same key for unchanged flights"
+    
+    changed_key = agent._analysis_cache_key([(params, [dict(flight, price=480)])], history)
+    assert changed_key != key, "Expected a new key when a flight changes"
+    
+    # A per-route list of the right length is used as-is; anything else is shared
+    analyses = [{'recommendation': 'a'}, {'recommendation': 'b'}]
+    assert agent._split_analyses({'analyses': analyses}, 2) == analyses, "Expected per-route analyses"
+    result = {'analyses': analyses}
+    assert agent._split_analyses(result, 3) == [result] * 3, "Expected wrong-length result to be shared"
+    assert agent._split_analyses("plain text", 2) == ["plain text"] * 2, "Expected non-dict result to be shared"
+    
+    print("✓ Analysis cache key tests passed")
+
+
+@structural
+def test_file_contains(fname: str, kind: str, matcher: Callable[[mmap.mmap], list]):
+    """Test that a static repository file contains its required tokens."""
+    print(f"Testing {fname}...")
+    
+    missing = _missing_tokens(os.path.join(HERE, fname), matcher)
+    assert not missing, f"Required {kind} {missing} not found in {fname}"
+    
+    print(f"✓ {fname} tests passed")
+
+
+if pytest:
+    test_file_contains = pytest.mark.parametrize(
+        "fname,kind,matcher", FILE_TOKEN_CASES, ids=[case[0] for case in FILE_TOKEN_CASES]
+    )(test_file_contains)
+
+
+@structural
 def test_agent_structure():
     """Test that agent.py has proper structure."""
     print("Testing agent.py structure...")
     
-    agent_path = Path(__file__).parent / "agent.py"
-    assert agent_path.exists(), "agent.py not found"
-    
-    with open(agent_path) as f:
-        content = f.read()
-        required_elements = [
-            'class FlightAgent',
-            'def search_flights',
-            'def analyze_flights',
-            'def run_daily_search',
-            'def start',
-            'if __name__ == "__main__"'
-        ]
-        for element in required_elements:
-            assert element in content, f"Required element '{element}' not found in agent.py"
+    agent_path = os.path.join(HERE, "agent.py")
+    with _open_repo_file(agent_path) as f:
+        tree = ast.parse(f.read(), agent_path)
+    
+    # Check definitions rather than text, so comments and formatting don't matter
+    agent_class = next(
+        (node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == 'FlightAgent'),
+        None
+    )
+    assert agent_class is not None, "class FlightAgent not found in agent.py"
+    
+    methods = {node.name for node in agent_class.body if isinstance(node, ast.FunctionDef)}
+    missing = [name for name in REQUIRED_AGENT_METHODS if name not in methods]
+    assert not missing, f"Required methods {missing} not found in FlightAgent"
+    
+    has_main_guard = any(
+        isinstance(node, ast.If)
+        and isinstance(node.test, ast.Compare)
+        and isinstance(node.test.left, ast.Name)
+        and node.test.left.id == '__name__'
+        for node in tree.body
+    )
+    assert has_main_guard, "if __name__ == \"__main__\" guard not found in agent.py"
     
     print("✓ Agent structure tests passed")
 
 
-def run_all_tests():
-    """Run all tests."""
+# (name, test, args) to run, set by run_all_tests before workers start
+_standalone_tests = []
+
+
+def _run_one(index: int) -> tuple:
+    """Run one standalone test, returning (name, outcome, message) so results pickle cleanly."""
+    name, test, args = _standalone_tests[index]
+    try:
+        test(*args)
+        return name, None, None
+    except AssertionError as e:
+        return name, 'failed', str(e)
+    except Exception as e:
+        return name, 'error', str(e)
+
+
+def run_all_tests(skip_structural: bool = False):
+    """
+    Run all tests.
+    
+    Args:
+        skip_structural: Skip the checks of static repository files
+    """
     print("=" * 50)
     print("Running Flight Search Agent Tests")
     print("=" * 50)
     print()
     
+    global _standalone_tests
     tests = [
-        test_configuration_structure,
-        test_dockerfile_structure,
-        test_requirements_file,
-        test_agent_structure,
-        test_memory_manager,
+        (f"test_file_contains[{case[0]}]", test_file_contains, case)
+        for case in FILE_TOKEN_CASES
+    ]
+    tests += [
+        (test.__name__, test, ())
+        for test in (
+            test_agent_structure,
+            test_memory_manager,
+            test_flight_search_cache,
+            test_chrome_profile_claim,
+            test_webdriver_pool,
+            test_rate_limiter,
+            test_grok_analyze_many,
+            test_email_html_escaping,
+            test_daily_search_analysis_failure,
+            test_analysis_cache_key,
+        )
     ]
     
-    failed = []
-    for test in tests:
+    if skip_structural:
+        tests = [entry for entry in tests if not getattr(entry[1], 'structural', False)]
+    _standalone_tests = tests
+    
+    # The tests share no state, so run them all at once across cores. Forked
+    # workers inherit the already-imported modules; threads are the fallback
+    # where fork is unavailable.
+    indexes = range(len(tests))
+    if 'fork' in multiprocessing.get_all_start_methods():
+        pool = multiprocessing.get_context('fork').Pool(min(len(tests), os.cpu_count() or 1))
         try:
-            test()
-        except AssertionError as e:
-            print(f"✗ {test.__name__} failed: {e}")
-            failed.append(test.__name__)
-        except Exception as e:
-            print(f"✗ {test.__name__} error: {e}")
-            failed.append(test.__name__)
+            results = pool.map(_run_one, indexes)
+        finally:
+            # close/join rather than terminate, so workers flush their output
+            pool.close()
+            pool.join()
+    else:
+        with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+            results = list(executor.map(_run_one, indexes))
+    
+    failed = []
+    for name, outcome, message in results:
+        if outcome is not None:
+            print(f"✗ {name} {outcome}: {message}")
+            failed.append(name)
     
     print()
     print("=" * 50)
@@ -196,4 +736,4 @@ def run_all_tests():
 
 
 if __name__ == "__main__":
-    sys.exit(run_all_tests())
+    sys.exit(run_all_tests(skip_structural='--skip-structural' in sys.argv[1:]))